@@ -6,23 +6,69 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import io
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-import plotly.express as px
+import os
+import datetime
+import tempfile
+import functools
+import uuid
+from collections import deque
+# reportlab and plotly are imported on first use to keep app start-up fast
+from pnl_engine import OPEX_ALLOCATIONS, SINGLE_PRODUCT_SECTIONS, compute_single_product, single_product_result, compute_batch, add_total_row, compact_results, write_results_excel
+from pnl_stream import stream_batch
+from pnl_montecarlo import DISTRIBUTIONS, distribution_around, simulate_net_profit, summarize
+from pnl_solver import SOLVER_COLUMNS, solve_targets
+from pnl_exact import MINOR_UNITS, ROUNDING_MODES, compute_batch_exact, single_product_exact, to_major_units
+from pnl_sensitivity import MAX_GRID_POINTS, MAX_TABLE_POINTS, SENSITIVITY_METRICS, SENSITIVITY_PARAMETERS, grid_points, sensitivity_grid, sensitivity_table
+from pnl_shipments import compute_shipments, load_shipments, shipment_summary, solve_shipments
+from pnl_fx import conversion_rates_on, first_rate_date, with_dated_currency_columns
+from pnl_catalogs import cache_catalog, cached_catalog, catalog_cache_stats, catalog_key, parse_catalog
+from pnl_jobs import find_job, forget_job, submit_job
+from pnl_store import save_results, load_results, store_export, store_path
+from pnl_dashboard import DEFAULT_TOP_N, dashboard_figures, dashboard_metrics
+from pnl_export import format_section, scenario_key, cached_export, submit_export, single_product_excel, single_product_pdf, batch_pdf
+from pnl_perf import PERF_LOG_PATH, begin_run, current_run, end_run, timed
+
+
+# Runs of this session kept for the debug performance panel (?debug=perf)
+PERF_RUNS_SHOWN = 10
+
+if 'perf_runs' not in st.session_state:
+    st.session_state.perf_session = uuid.uuid4().hex[:12]
+    st.session_state.perf_runs = deque(maxlen=PERF_RUNS_SHOWN)
+
+
+def begin_perf_run(label):
+    run = begin_run(label, session=st.session_state.perf_session)
+    st.session_state.perf_runs.append(run)
+    return run
+
+
+def perf_fragment(function):
+    # Times a fragment; when it reruns on its own it is timed as its own run
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        run = None if current_run() is not None else begin_perf_run(function.__name__)
+        try:
+            with timed(function.__name__):
+                return function(*args, **kwargs)
+        finally:
+            if run is not None:
+                end_run(run)
+    return wrapper
+
+
+app_run = begin_perf_run("app")
 
 
 
 # Title of the application
 st.title("Financial Analysis Tool")
 
-# Define conversion rates globally
-conversion_rates = {
-    "SAR": 4.11,
-    "AED": 3.91
-}
+# Conversion rates in force on the Tab 1 rate date (today until one is
+# picked), from the dated rates table
+conversion_rates = conversion_rates_on(st.session_state.get("tab1_rate_date"))
 
 # Initialize variables with default values
 if 'tab1_vars' not in st.session_state:
@@ -47,6 +93,10 @@ if 'tab1_vars' not in st.session_state:
 # Create tabs at the top for different functionalities
 tab1, tab2, tab3 = st.tabs(["Single Product Model", "Batch Product Analysis", "Dashboard"])
 
+# Count full-app runs so the fragments below can tell whether the
+# dashboard has already been drawn in the current run
+st.session_state.app_run_count = st.session_state.get("app_run_count", 0) + 1
+
 # Initialize active tab in session state
 if 'active_tab' not in st.session_state:
     st.session_state.active_tab = 'tab1'  # Default to Tab 1
@@ -85,504 +135,221 @@ if st.session_state.active_tab == 'tab1':
         st.session_state.tab1_vars["licences_aed"] = st.number_input("Licences (AED)", value=st.session_state.tab1_vars["licences_aed"], format="%.2f", key="tab1_licences")
         st.session_state.tab1_vars["depreciation_aed"] = st.number_input("Depreciation (AED)", value=st.session_state.tab1_vars["depreciation_aed"], format="%.2f", key="tab1_depreciation")
 
+        # Exchange rates (read at the top of the next run)
+        st.subheader("Exchange Rates")
+        st.date_input("Exchange Rate Date", value=datetime.date.today(), min_value=first_rate_date(), key="tab1_rate_date")
+        st.caption(", ".join(f"{rate:,.4f} {currency} per EUR" for currency, rate in conversion_rates.items()))
+
 # Sidebar remains hidden for Tab 2
 if st.session_state.active_tab == 'tab2':
     st.sidebar.empty()
     
-# Tab 1: Single Product Model
-with tab1:
-    st.header("Single Product Model")
-    
-    # Use variables from session state
-    exw_cost = st.session_state.tab1_vars["exw_cost"]
-    fob_cost = st.session_state.tab1_vars["fob_cost"]
-    freight_cost = st.session_state.tab1_vars["freight_cost"]
-    packaging_cost = st.session_state.tab1_vars["packaging_cost"]
-    warehousing_cost = st.session_state.tab1_vars["warehousing_cost"]
-    markup_percentage = st.session_state.tab1_vars["markup_percentage"]
-    revenue_share_percentage = st.session_state.tab1_vars["revenue_share_percentage"]
-    projected_units_sold = st.session_state.tab1_vars["projected_units_sold"]
-    
-    # Calculate Sales Price per Unit
-    base_price = exw_cost + ((freight_cost + fob_cost) / projected_units_sold) + (packaging_cost + warehousing_cost)
-    selling_price = base_price + (base_price * markup_percentage / 100)
-
-    # Revenue Share per Unit
-    revenue_share_per_unit = selling_price * (revenue_share_percentage / 100)
-
-    # Calculations for single product
-    direct_revenue = selling_price * projected_units_sold  # EUR
-    total_revenue_share = revenue_share_per_unit * projected_units_sold  # EUR
-    total_revenue = direct_revenue + total_revenue_share  # EUR
-
-    # Cost of Goods Sold (COGS)
-    total_freight_and_logistics = freight_cost + fob_cost
-    total_cogs = (
-        (exw_cost * projected_units_sold)
-        + total_freight_and_logistics
-        + (packaging_cost * projected_units_sold)
-        + (warehousing_cost * projected_units_sold)
-    )
 
-    # Gross Profit
-    gross_profit_direct = direct_revenue - total_cogs  # EUR
-    gross_profit_total = total_revenue - total_cogs  # EUR
-    gross_margin_direct = (gross_profit_direct / direct_revenue) * 100 if direct_revenue != 0 else 0
-    gross_margin_total = (gross_profit_total / total_revenue) * 100 if total_revenue != 0 else 0
+# Background jobs: long-running work runs in worker threads so the session
+# stays responsive; this session's jobs are kept in st.session_state.jobs.
+# Jobs are shared with other sessions on the same inputs, which is why
+# cancelling one is per session (job_session)
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = {}
+    st.session_state.job_session = uuid.uuid4().hex
 
-    # Operating Expenses
-    operating_expenses_aed = (
-        (st.session_state.tab1_vars["salaries_aed"] * 12) + (st.session_state.tab1_vars["rental_aed"] * 12) + (st.session_state.tab1_vars["utilities_aed"] * 12) + st.session_state.tab1_vars["sales_tax_aed"] + st.session_state.tab1_vars["admin_aed"] + st.session_state.tab1_vars["licences_aed"] + st.session_state.tab1_vars["depreciation_aed"]
-    )
-    operating_expenses_eur = operating_expenses_aed / conversion_rates["AED"]
-    operating_expenses_sar = operating_expenses_aed / (conversion_rates["AED"] / conversion_rates["SAR"])
-
-    # Net Profit
-    net_profit_direct = gross_profit_direct - operating_expenses_eur  # EUR
-    net_profit_total = gross_profit_total - operating_expenses_eur  # EUR
-    net_profit_margin_direct = (net_profit_direct / direct_revenue) * 100 if direct_revenue != 0 else 0
-    net_profit_margin_total = (net_profit_total / total_revenue) * 100 if total_revenue != 0 else 0
-
-    # Display outputs in tables
-    # Revenue Table
-    st.header("Revenue and Selling Price")
-    revenue_data = {
-        "Metric": [
-            "Selling Price per Unit",
-            "Number of Units Sold",
-            "Direct Revenue",
-            "Revenue Share per Unit",
-            "Revenue Share",
-            "Total Revenue"
-        ],
-        "EUR": [
-            f"{selling_price:,.2f} EUR",
-            f"{projected_units_sold:,} units",
-            f"{direct_revenue:,.2f} EUR",
-            f"{revenue_share_per_unit:,.2f} EUR",
-            f"{total_revenue_share:,.2f} EUR",
-            f"{total_revenue:,.2f} EUR"
-        ],
-        "SAR": [
-            f"{selling_price * conversion_rates['SAR']:,.2f} SAR",
-            f"{projected_units_sold:,} units",
-            f"{direct_revenue * conversion_rates['SAR']:,.2f} SAR",
-            f"{revenue_share_per_unit * conversion_rates['SAR']:,.2f} SAR",
-            f"{total_revenue_share * conversion_rates['SAR']:,.2f} SAR",
-            f"{total_revenue * conversion_rates['SAR']:,.2f} SAR"
-        ],
-        "AED": [
-            f"{selling_price * conversion_rates['AED']:,.2f} AED",
-            f"{projected_units_sold:,} units",
-            f"{direct_revenue * conversion_rates['AED']:,.2f} AED",
-            f"{revenue_share_per_unit * conversion_rates['AED']:,.2f} AED",
-            f"{total_revenue_share * conversion_rates['AED']:,.2f} AED",
-            f"{total_revenue * conversion_rates['AED']:,.2f} AED"
-        ]
-    }
-    st.table(revenue_data)
-
-    # COGS Table
-    st.header("Cost of Goods Sold (COGS)")
-    cogs_data = {
-        "Metric": [
-            "EXW Cost per Unit",
-            "Freight and Logistics Costs",
-            "Packaging and Printing Cost per Unit",
-            "Warehousing Cost per Unit",
-            "Total COGS"
-        ],
-        "EUR": [
-            f"{exw_cost:,.2f} EUR",
-            f"{total_freight_and_logistics:,.2f} EUR",
-            f"{packaging_cost:,.2f} EUR",
-            f"{warehousing_cost:,.2f} EUR",
-            f"{total_cogs:,.2f} EUR"
-        ],
-        "SAR": [
-            f"{exw_cost * conversion_rates['SAR']:,.2f} SAR",
-            f"{total_freight_and_logistics * conversion_rates['SAR']:,.2f} SAR",
-            f"{packaging_cost * conversion_rates['SAR']:,.2f} SAR",
-            f"{warehousing_cost * conversion_rates['SAR']:,.2f} SAR",
-            f"{total_cogs * conversion_rates['SAR']:,.2f} SAR"
-        ],
-        "AED": [
-            f"{exw_cost * conversion_rates['AED']:,.2f} AED",
-            f"{total_freight_and_logistics * conversion_rates['AED']:,.2f} AED",
-            f"{packaging_cost * conversion_rates['AED']:,.2f} AED",
-            f"{warehousing_cost * conversion_rates['AED']:,.2f} AED",
-            f"{total_cogs * conversion_rates['AED']:,.2f} AED"
-        ]
-    }
-    st.table(cogs_data)
-
-    # Gross Profit Table
-    st.header("Gross Profit")
-    gross_profit_data = {
-        "Metric": [
-            "Gross Profit (Direct Revenue only)",
-            "Gross Margin (Direct Revenue only)",
-            "Gross Profit (Direct + Revenue Share)",
-            "Gross Margin (Direct + Revenue Share)"
-        ],
-        "EUR": [
-            f"{gross_profit_direct:,.2f} EUR",
-            f"{gross_margin_direct:.2f}%",
-            f"{gross_profit_total:,.2f} EUR",
-            f"{gross_margin_total:.2f}%"
-        ],
-        "SAR": [
-            f"{gross_profit_direct * conversion_rates['SAR']:,.2f} SAR",
-            "-",
-            f"{gross_profit_total * conversion_rates['SAR']:,.2f} SAR",
-            "-"
-        ],
-        "AED": [
-            f"{gross_profit_direct * conversion_rates['AED']:,.2f} AED",
-            "-",
-            f"{gross_profit_total * conversion_rates['AED']:,.2f} AED",
-            "-"
-        ]
-    }
-    st.table(gross_profit_data)
-
-    # Operating Expenses Table
-    st.header("Operating Expenses")
-    operating_expenses_data = {
-        "Metric": [
-            "Salaries",
-            "Rental",
-            "Utilities",
-            "Sales Tax",
-            "Admin",
-            "Licences",
-            "Depreciation",
-            "Total Operating Expenses"
-        ],
-        "AED": [
-            f"{st.session_state.tab1_vars['salaries_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['rental_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['utilities_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['sales_tax_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['admin_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['licences_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['depreciation_aed']:,.2f} AED",
-            f"{operating_expenses_aed:,.2f} AED"
-        ],
-        "EUR": [
-            f"{st.session_state.tab1_vars['salaries_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['rental_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['utilities_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['sales_tax_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['admin_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['licences_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['depreciation_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{operating_expenses_eur:,.2f} EUR"
-        ],
-        "SAR": [
-            f"{st.session_state.tab1_vars['salaries_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['rental_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['utilities_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['sales_tax_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['admin_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['licences_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['depreciation_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{operating_expenses_sar:,.2f} SAR"
-        ]
-    }
-    st.table(operating_expenses_data)
-
-    # Net Profit Table
-    st.header("Net Profit")
-    net_profit_data = {
-        "Metric": [
-            "Net Profit (Direct Revenue only)",
-            "Net Profit Margin (Direct Revenue only)",
-            "Net Profit (Direct + Revenue Share)",
-            "Net Profit Margin (Direct + Revenue Share)"
-        ],
-        "EUR": [
-            f"{net_profit_direct:,.2f} EUR",
-            f"{net_profit_margin_direct:.2f}%",
-            f"{net_profit_total:,.2f} EUR",
-            f"{net_profit_margin_total:.2f}%"
-        ],
-        "SAR": [
-            f"{net_profit_direct * conversion_rates['SAR']:,.2f} SAR",
-            "-",
-            f"{net_profit_total * conversion_rates['SAR']:,.2f} SAR",
-            "-"
-        ],
-        "AED": [
-            f"{net_profit_direct * conversion_rates['AED']:,.2f} AED",
-            "-",
-            f"{net_profit_total * conversion_rates['AED']:,.2f} AED",
-            "-"
-        ]
-    }
-    st.table(net_profit_data)
-
-    # Prepare data for each section
-    revenue_data = {
-        "Metric": [
-            "Selling Price per Unit",
-            "Number of Units Sold",
-            "Direct Revenue",
-            "Revenue Share per Unit",
-            "Revenue Share",
-            "Total Revenue",
-        ],
-        "EUR": [
-            f"{selling_price:,.2f} EUR",
-            f"{projected_units_sold:,} units",
-            f"{direct_revenue:,.2f} EUR",
-            f"{revenue_share_per_unit:,.2f} EUR",
-            f"{total_revenue_share:,.2f} EUR",
-            f"{total_revenue:,.2f} EUR",
-        ],
-        "SAR": [
-            f"{selling_price * conversion_rates['SAR']:,.2f} SAR",
-            f"{projected_units_sold:,} units",
-            f"{direct_revenue * conversion_rates['SAR']:,.2f} SAR",
-            f"{revenue_share_per_unit * conversion_rates['SAR']:,.2f} SAR",
-            f"{total_revenue_share * conversion_rates['SAR']:,.2f} SAR",
-            f"{total_revenue * conversion_rates['SAR']:,.2f} SAR",
-        ],
-        "AED": [
-            f"{selling_price * conversion_rates['AED']:,.2f} AED",
-            f"{projected_units_sold:,} units",
-            f"{direct_revenue * conversion_rates['AED']:,.2f} AED",
-            f"{revenue_share_per_unit * conversion_rates['AED']:,.2f} AED",
-            f"{total_revenue_share * conversion_rates['AED']:,.2f} AED",
-            f"{total_revenue * conversion_rates['AED']:,.2f} AED",
-        ],
-    }
 
-    cogs_data = {
-        "Metric": [
-            "EXW Cost per Unit",
-            "Freight and Logistics Costs",
-            "Packaging and Printing Cost per Unit",
-            "Warehousing Cost per Unit",
-            "Total COGS",
-        ],
-        "EUR": [
-            f"{exw_cost:,.2f} EUR",
-            f"{total_freight_and_logistics:,.2f} EUR",
-            f"{packaging_cost:,.2f} EUR",
-            f"{warehousing_cost:,.2f} EUR",
-            f"{total_cogs:,.2f} EUR",
-        ],
-        "SAR": [
-            f"{exw_cost * conversion_rates['SAR']:,.2f} SAR",
-            f"{total_freight_and_logistics * conversion_rates['SAR']:,.2f} SAR",
-            f"{packaging_cost * conversion_rates['SAR']:,.2f} SAR",
-            f"{warehousing_cost * conversion_rates['SAR']:,.2f} SAR",
-            f"{total_cogs * conversion_rates['SAR']:,.2f} SAR",
-        ],
-        "AED": [
-            f"{exw_cost * conversion_rates['AED']:,.2f} AED",
-            f"{total_freight_and_logistics * conversion_rates['AED']:,.2f} AED",
-            f"{packaging_cost * conversion_rates['AED']:,.2f} AED",
-            f"{warehousing_cost * conversion_rates['AED']:,.2f} AED",
-            f"{total_cogs * conversion_rates['AED']:,.2f} AED",
-        ],
-    }
+def retry_requested(kind):
+    # Whether the Retry button of a failed or cancelled job was just clicked
+    return st.session_state.get(f"retry_{kind}", False)
 
-    gross_profit_data = {
-        "Metric": [
-            "Gross Profit (Direct Revenue only)",
-            "Gross Margin (Direct Revenue only)",
-            "Gross Profit (Direct + Revenue Share)",
-            "Gross Margin (Direct + Revenue Share)",
-        ],
-        "EUR": [
-            f"{gross_profit_direct:,.2f} EUR",
-            f"{gross_margin_direct:.2f}%",
-            f"{gross_profit_total:,.2f} EUR",
-            f"{gross_margin_total:.2f}%",
-        ],
-        "SAR": [
-            f"{gross_profit_direct * conversion_rates['SAR']:,.2f} SAR",
-            "-",
-            f"{gross_profit_total * conversion_rates['SAR']:,.2f} SAR",
-            "-",
-        ],
-        "AED": [
-            f"{gross_profit_direct * conversion_rates['AED']:,.2f} AED",
-            "-",
-            f"{gross_profit_total * conversion_rates['AED']:,.2f} AED",
-            "-",
-        ],
-    }
 
-    operating_expenses_data = {
-        "Metric": [
-            "Salaries",
-            "Rental",
-            "Utilities",
-            "Sales Tax",
-            "Admin",
-            "Licences",
-            "Depreciation",
-            "Total Operating Expenses",
-        ],
-        "AED": [
-            f"{st.session_state.tab1_vars['salaries_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['rental_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['utilities_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['sales_tax_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['admin_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['licences_aed']:,.2f} AED",
-            f"{st.session_state.tab1_vars['depreciation_aed']:,.2f} AED",
-            f"{operating_expenses_aed:,.2f} AED",
-        ],
-        "EUR": [
-            f"{st.session_state.tab1_vars['salaries_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['rental_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['utilities_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['sales_tax_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['admin_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['licences_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{st.session_state.tab1_vars['depreciation_aed'] / conversion_rates['AED']:,.2f} EUR",
-            f"{operating_expenses_eur:,.2f} EUR",
-        ],
-        "SAR": [
-            f"{st.session_state.tab1_vars['salaries_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['rental_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['utilities_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['sales_tax_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['admin_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['licences_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{st.session_state.tab1_vars['depreciation_aed'] / (conversion_rates['AED'] / conversion_rates['SAR']):,.2f} SAR",
-            f"{operating_expenses_sar:,.2f} SAR",
-        ],
-    }
+def start_job(kind, key, label, function, *args, retry=False, **kwargs):
+    # A failed or cancelled job is only started again from its Retry button,
+    # or with retry when the user explicitly asked for it again
+    return submit_job(kind, key, label, function, *args, session=st.session_state.job_session, retry=retry or retry_requested(kind), **kwargs)
+
 
-    net_profit_data = {
-        "Metric": [
-            "Net Profit (Direct Revenue only)",
-            "Net Profit Margin (Direct Revenue only)",
-            "Net Profit (Direct + Revenue Share)",
-            "Net Profit Margin (Direct + Revenue Share)",
-        ],
-        "EUR": [
-            f"{net_profit_direct:,.2f} EUR",
-            f"{net_profit_margin_direct:.2f}%",
-            f"{net_profit_total:,.2f} EUR",
-            f"{net_profit_margin_total:.2f}%",
-        ],
-        "SAR": [
-            f"{net_profit_direct * conversion_rates['SAR']:,.2f} SAR",
-            "-",
-            f"{net_profit_total * conversion_rates['SAR']:,.2f} SAR",
-            "-",
-        ],
-        "AED": [
-            f"{net_profit_direct * conversion_rates['AED']:,.2f} AED",
-            "-",
-            f"{net_profit_total * conversion_rates['AED']:,.2f} AED",
-            "-",
-        ],
+def job_running(job):
+    # Whether a job is running as this session sees it (not cancelled by it)
+    return job is not None and job.status_for(st.session_state.job_session) in ("running", "cancelling")
+
+
+@st.fragment(run_every=0.5)
+def job_progress(kind, key, cancellable=True):
+    # Polls a running job, which keeps this session subscribed to it, and
+    # reruns the app once it has finished or this session cancelled it
+    job = find_job(kind, key)
+    if not job_running(job):
+        st.rerun(scope="app")
+    job.subscribe(st.session_state.job_session)
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        st.progress(job.progress, text=f"{job.label}: {job.message}" if job.message else job.label)
+    with col2:
+        if job.status == "cancelling":
+            st.caption("Cancelling...")
+        elif cancellable and st.button("Cancel", key=f"cancel_{kind}"):
+            # Other sessions following the same job keep it running
+            job.cancel(st.session_state.job_session)
+            st.rerun(scope="app")
+
+
+def job_status(kind, key, cancellable=True):
+    """Progress of a running job, or why it stopped; True once it is done.
+
+    The job is listed among this session's jobs from its first status on.
+    Jobs that only report progress before one long step can't stop in
+    between, so they are shown without a Cancel button (cancellable=False).
+    """
+    job = find_job(kind, key)
+    if job is None:
+        return False
+    st.session_state.jobs[kind] = key
+    job.subscribe(st.session_state.job_session)
+    status = job.status_for(st.session_state.job_session)
+    if status in ("running", "cancelling"):
+        job_progress(kind, key, cancellable)
+    elif status in ("failed", "cancelled"):
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            if status == "failed":
+                st.error(f"{job.label} failed: {job.future.exception()}")
+            else:
+                st.info(f"{job.label} was cancelled.")
+        with col2:
+            st.button("Retry", key=f"retry_{kind}")
+    return status == "done"
+
+
+def simulate_summaries(inputs, conversion_rates, distributions, samples, seed=0, progress=None):
+    # Only the summaries are kept, not the samples
+    net_profit = simulate_net_profit(inputs, conversion_rates, distributions, samples, seed=seed, progress=progress)
+    return {currency: summarize(values) for currency, values in net_profit.items()}
+
+
+# Monte Carlo risk simulation around the Tab 1 inputs and conversion rates
+@st.fragment
+@perf_fragment
+def risk_simulation_section():
+    st.header("Risk Simulation (Monte Carlo)")
+    uncertain = {
+        "exw_cost": "EXW Cost per Unit (EUR)",
+        "freight_cost": "Freight Cost (Total, EUR)",
+        "fob_cost": "FOB Cost (Total, EUR)",
+        "projected_units_sold": "Projected Units Sold",
+        **{currency: f"{currency} per EUR" for currency in conversion_rates},
     }
+    base_values = {**st.session_state.tab1_vars, **conversion_rates}
 
-    # Save to Excel
-    output_buffer = io.BytesIO()
-    with pd.ExcelWriter(output_buffer, engine="xlsxwriter") as writer:
-        pd.DataFrame(revenue_data).to_excel(writer, index=False, sheet_name="Revenue")
-        pd.DataFrame(cogs_data).to_excel(writer, index=False, sheet_name="COGS")
-        pd.DataFrame(gross_profit_data).to_excel(writer, index=False, sheet_name="Gross Profit")
-        pd.DataFrame(operating_expenses_data).to_excel(writer, index=False, sheet_name="Operating Expenses")
-        pd.DataFrame(net_profit_data).to_excel(writer, index=False, sheet_name="Net Profit")
-        writer.close()  # Ensure the writer is closed
-    output_buffer.seek(0)  # Reset buffer position
-
-    # Move the Tab 1 download button inside tab1
-    st.download_button(
-        label="Download Tab 1 Results as Excel",
-        data=output_buffer.getvalue(),
-        file_name="tab1_analysis_results.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-    )
+    distributions = {}
+    for key, label in uncertain.items():
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            st.write(f"{label}: {base_values[key]:,.2f}")
+        with col2:
+            kind = st.selectbox("Distribution", DISTRIBUTIONS, key=f"risk_{key}_distribution", label_visibility="collapsed")
+        with col3:
+            spread = st.number_input("Spread (± %)", min_value=0.0, value=10.0, format="%.1f", key=f"risk_{key}_spread", label_visibility="collapsed")
+        distributions[key] = distribution_around(base_values[key], kind, spread)
 
-    # Create PDF report
-    def create_pdf(revenue_data, cogs_data, gross_profit_data, operating_expenses_data, net_profit_data):
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        
-        # Create custom style for main header
-        main_header_style = styles['Heading1'].clone('MainHeader')
-        main_header_style.textColor = colors.HexColor('#000080')
-        main_header_style.alignment = 1
-        main_header_style.spaceAfter = 20
-        main_header_style.fontSize = 16
-        
-        # Add main header
-        elements.append(Paragraph("P&L Globlex LLC-FZ", main_header_style))
-        
-        # Helper function to create formatted tables
-        def create_table(data, title):
-            # Smaller heading style
-            heading_style = styles['Heading3'].clone('TableHeading')
-            heading_style.fontSize = 10
-            heading_style.spaceAfter = 4
-            
-            elements.append(Paragraph(title, heading_style))
-            
-            # Convert dictionary to list of lists for the table
-            table_data = [list(data.keys())]  # Headers
-            for i in range(len(list(data.values())[0])):
-                row = [data[col][i] for col in data.keys()]
-                table_data.append(row)
-            
-            # Calculate column widths based on content
-            available_width = 500  # Approximate available width in points
-            col_widths = [available_width * x for x in [0.4, 0.2, 0.2, 0.2]]  # 40% for first column, 20% for others
-            
-            table = Table(table_data, colWidths=col_widths, repeatRows=1)
-            table.setStyle(TableStyle([
-                # Header style
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#000080')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 7),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 4),
-                # Data rows style
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 6),
-                ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
-            elements.append(table)
-            elements.append(Spacer(1, 8))
-
-        # Create all tables in sequence
-        create_table(revenue_data, "Revenue and Selling Price")
-        create_table(cogs_data, "Cost of Goods Sold (COGS)")
-        create_table(gross_profit_data, "Gross Profit")
-        create_table(operating_expenses_data, "Operating Expenses")
-        create_table(net_profit_data, "Net Profit")
-
-        # Build PDF
-        doc.build(elements)
-        buffer.seek(0)
-        return buffer
-
-    # Add PDF download button
-    pdf_buffer = create_pdf(revenue_data, cogs_data, gross_profit_data, operating_expenses_data, net_profit_data)
+    col1, col2 = st.columns(2)
+    with col1:
+        samples = st.selectbox("Samples", [10_000, 100_000, 1_000_000, 5_000_000], index=2, format_func="{:,}".format, key="risk_samples")
+    with col2:
+        seed = st.number_input("Random seed", min_value=0, value=0, step=1, key="risk_seed")
+
+    simulation_key = scenario_key([st.session_state.tab1_vars, distributions, samples, seed], conversion_rates)
+    if st.button("Run simulation", key="risk_run"):
+        start_job("risk_simulation", simulation_key, f"Simulating {samples:,} scenarios", simulate_summaries, dict(st.session_state.tab1_vars), dict(conversion_rates), distributions, samples, seed=seed, retry=True)
+    if job_status("risk_simulation", simulation_key):
+        st.session_state.risk_simulation = {"key": simulation_key, "summaries": find_job("risk_simulation", simulation_key).result()}
+
+    risk_simulation = st.session_state.get("risk_simulation")
+    if risk_simulation is not None:
+        if risk_simulation["key"] != simulation_key:
+            st.caption("Inputs changed since the last run. Run the simulation again to update these results.")
+        summary = risk_simulation["summaries"]["EUR"]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Mean Net Profit (EUR)", f"{summary['mean']:,.2f}")
+        col2.metric("P5 Net Profit (EUR)", f"{summary['percentiles'][5]:,.2f}")
+        col3.metric("P95 Net Profit (EUR)", f"{summary['percentiles'][95]:,.2f}")
+        col4.metric("Probability of Loss", f"{summary['probability_of_loss'] * 100:.2f}%")
+
+        st.table({
+            "Percentile": [f"P{percentile}" for percentile in summary["percentiles"]],
+            **{
+                currency: [f"{value:,.2f} {currency}" for value in currency_summary["percentiles"].values()]
+                for currency, currency_summary in risk_simulation["summaries"].items()
+            },
+        })
+
+        import plotly.graph_objects as go
+
+        counts, edges = summary["histogram"]
+        fig_risk = go.Figure(go.Bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, width=np.diff(edges)))
+        fig_risk.update_layout(title="Net Profit Distribution (EUR)", xaxis_title="Net Profit (EUR)", yaxis_title="Scenarios")
+        fig_risk.add_vline(x=0, line_color="red")
+        with timed("tab1.risk_chart"):
+            st.plotly_chart(fig_risk, use_container_width=True)
+
+
+# Tab 1: Single Product Model
+# Runs as a fragment so its own widgets don't rerun the other tabs
+@st.fragment
+@perf_fragment
+def single_product_tab():
+    st.header("Single Product Model")
     
-    st.download_button(
-        label="Download Tab 1 Results as PDF",
-        data=pdf_buffer,
-        file_name="tab1_analysis_results.pdf",
-        mime="application/pdf",
-    )
+    # Exact money: integer cents with explicit rounding at every step
+    col1, col2 = st.columns(2)
+    with col1:
+        exact_money = st.checkbox("Exact money (integer cents)", key="tab1_exact_money")
+    with col2:
+        rounding_tab1 = st.selectbox("Rounding", list(ROUNDING_MODES), format_func=ROUNDING_MODES.get, key="tab1_rounding", disabled=not exact_money)
+    money_rounding = rounding_tab1 if exact_money else None
+
+    # Calculate the P&L and keep it as numbers in every currency
+    with timed("tab1.compute", exact=exact_money):
+        if money_rounding is None:
+            model = compute_single_product(st.session_state.tab1_vars, conversion_rates)
+            result = single_product_result(st.session_state.tab1_vars, model, conversion_rates)
+        else:
+            result = single_product_exact(st.session_state.tab1_vars, conversion_rates, money_rounding)
+
+    # Display outputs in tables, formatted only here
+    with timed("tab1.tables"):
+        for name, title, *_ in SINGLE_PRODUCT_SECTIONS:
+            st.header(title)
+            st.table(format_section(result, name))
+
+    # Exports are built only when requested, in worker threads, and cached
+    # per scenario so repeated downloads don't rebuild them
+    export_key = scenario_key([st.session_state.tab1_vars, money_rounding], conversion_rates)
+    excel_bytes = cached_export("tab1_excel", export_key)
+    pdf_bytes = cached_export("tab1_pdf", export_key)
+    if excel_bytes is None or pdf_bytes is None:
+        if st.button("Prepare Tab 1 Excel and PDF downloads", key="tab1_prepare_exports"):
+            excel_future = submit_export("tab1_excel", export_key, single_product_excel, result)
+            pdf_future = submit_export("tab1_pdf", export_key, single_product_pdf, result)
+            with st.spinner("Building Excel and PDF..."):
+                excel_bytes = excel_future.result()
+                pdf_bytes = pdf_future.result()
+
+    if excel_bytes is not None and pdf_bytes is not None:
+        st.download_button(
+            label="Download Tab 1 Results as Excel",
+            data=excel_bytes,
+            file_name="tab1_analysis_results.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        st.download_button(
+            label="Download Tab 1 Results as PDF",
+            data=pdf_bytes,
+            file_name="tab1_analysis_results.pdf",
+            mime="application/pdf",
+        )
+
+    risk_simulation_section()
+
+
+with tab1:
+    single_product_tab()
 
 
 
@@ -590,7 +357,319 @@ with tab1:
 # In[ ]:
 
 
-with tab2:  # Batch Product Analysis tab
+# Paginated bulk editor for the "Units" column of an uploaded price list.
+# Only the visible page is sent to the browser and only edited cells are
+# written back into st.session_state.batch_units; every change bumps
+# st.session_state.batch_units_version.
+def set_batch_units(positions, new_units):
+    # Write units and keep the running total used for the freight/FOB
+    # allocation, so edits cost O(changed products) before the P&L pass
+    units = st.session_state.batch_units
+    st.session_state.batch_total_units += int(np.sum(new_units) - units[positions].sum())
+    units[positions] = new_units
+    st.session_state.batch_units_version += 1
+
+
+def units_editor(data):
+    units = st.session_state.batch_units
+
+    # Filter and pagination controls
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        name_filter = st.text_input("Filter products by name", key="units_filter")
+    if name_filter:
+        mask = data["Product Name"].astype(str).str.contains(name_filter, case=False, regex=False).to_numpy()
+        positions = np.flatnonzero(mask)
+    else:
+        positions = np.arange(len(data))
+    with col2:
+        page_size = st.selectbox("Rows per page", [50, 100, 250, 500], key="units_page_size")
+    page_count = max(1, -(-len(positions) // page_size))
+    st.session_state.setdefault("units_page", 1)
+    if st.session_state.units_page > page_count:
+        st.session_state.units_page = page_count
+    with col3:
+        page = st.number_input("Page", min_value=1, max_value=page_count, step=1, key="units_page")
+
+    # Bulk operations on every product matching the filter
+    with st.expander(f"Bulk edit ({len(positions):,} filtered products)"):
+        col1, col2 = st.columns(2)
+        with col1:
+            bulk_units = st.number_input("Units", min_value=0, value=0, step=1, key="bulk_units")
+            if st.button("Set units for filtered products", key="bulk_set_units"):
+                set_batch_units(positions, np.full(len(positions), bulk_units, dtype="int64"))
+                st.session_state.units_editor_version += 1
+        with col2:
+            scale_percentage = st.number_input("Scale by (%)", value=0.0, format="%.2f", key="bulk_scale_percentage")
+            if st.button("Scale units of filtered products", key="bulk_scale_units"):
+                scaled = np.rint(units[positions] * (1 + scale_percentage / 100))
+                set_batch_units(positions, np.clip(scaled, 0, None).astype("int64"))
+                st.session_state.units_editor_version += 1
+
+    # Write back the cells edited in this page's grid
+    start = (page - 1) * page_size
+    page_positions = positions[start:start + page_size]
+    editor_key = f"units_editor_{st.session_state.units_editor_version}_{name_filter}_{page_size}_{page}"
+    editor_state = st.session_state.get(editor_key)
+    if editor_state:
+        for row, changes in editor_state["edited_rows"].items():
+            if "Units" in changes:
+                position = page_positions[int(row)]
+                new_units = max(0, int(changes["Units"] or 0))
+                if units[position] != new_units:
+                    set_batch_units(position, new_units)
+
+    page_data = pd.DataFrame({
+        "Product Name": data["Product Name"].iloc[page_positions].to_numpy(),
+        "EXW Cost": data["EXW Cost"].iloc[page_positions].to_numpy(),
+        "Units": units[page_positions],
+    })
+    st.data_editor(
+        page_data,
+        key=editor_key,
+        hide_index=True,
+        use_container_width=True,
+        disabled=["Product Name", "EXW Cost"],
+        column_config={"Units": st.column_config.NumberColumn("Units", min_value=0, step=1)},
+    )
+    st.caption(f"Showing {start + 1 if len(page_positions) else 0:,}-{start + len(page_positions):,} of {len(positions):,} products. Total units: {units.sum():,}")
+    return units
+
+
+def named_upload(uploaded_file):
+    # Private copy of an upload for a background job, keeping its file name
+    source = io.BytesIO(uploaded_file.getvalue())
+    source.name = uploaded_file.name
+    return source
+
+
+def read_upload(raw, name, key, progress=None):
+    # Parse an upload no session has parsed yet and share it with them all
+    if progress is not None:
+        progress(0, "Parsing")
+    return cache_catalog(key, parse_catalog(raw, name))
+
+
+def remove_stream_result(result):
+    # Cleanup of a forgotten streaming job: its results file goes with it
+    output_path, _ = result
+    if os.path.exists(output_path):
+        os.remove(output_path)
+
+
+def stream_to_temp_file(source, batch_params, conversion_rates, opex_allocation, progress=None):
+    with tempfile.NamedTemporaryFile(prefix="batch_analysis_", suffix=".csv", delete=False) as output:
+        output_path = output.name
+    try:
+        total_row = stream_batch(source, output_path, batch_params, conversion_rates, opex_allocation=opex_allocation, progress=progress)
+    except BaseException:
+        os.remove(output_path)
+        raise
+    return output_path, total_row
+
+
+# Out-of-core batch analysis: the upload is processed in chunks and the
+# results are written to a CSV file in the temp directory, which lives as
+# long as the job that wrote it is kept
+def streaming_batch(uploaded_file, batch_params, conversion_rates, opex_allocation):
+    stream_key = (uploaded_file.file_id, tuple(batch_params.values()), tuple(conversion_rates.values()), opex_allocation)
+    if find_job("stream_batch", stream_key) is None or retry_requested("stream_batch"):
+        start_job("stream_batch", stream_key, f"Processing {uploaded_file.name} in chunks", stream_to_temp_file, named_upload(uploaded_file), dict(batch_params), dict(conversion_rates), opex_allocation, cleanup=remove_stream_result)
+    if not job_status("stream_batch", stream_key):
+        return
+    output_path, total_row = find_job("stream_batch", stream_key).result()
+
+    st.write("### Batch Analysis Totals")
+    st.dataframe(pd.DataFrame([total_row]))
+    st.write("### Batch Analysis Results (first 1,000 products)")
+    st.dataframe(pd.read_csv(output_path, nrows=1000))
+
+    with open(output_path, "rb") as results_file:
+        st.download_button(
+            label="Download Results as CSV",
+            data=results_file,
+            file_name="batch_analysis_results.csv",
+            mime="text/csv",
+        )
+
+
+def with_totals(results_df, solved=None):
+    # Attach the solver columns and a total row (solved values don't add up)
+    if solved is not None:
+        results_df = pd.concat([results_df, solved], axis=1)
+    results_df = add_total_row(results_df)
+    if solved is not None:
+        results_df.loc[results_df.index[-1], SOLVER_COLUMNS] = np.nan
+    return results_df
+
+
+def load_batch_results(batch_model, converted=False):
+    # Stored results of the batch model; results pruned from the store are
+    # computed again by dropping the model and its job and rerunning the app
+    try:
+        return load_results(batch_model["result_id"], converted=converted)
+    except FileNotFoundError:
+        forget_job("batch_analysis", batch_model["key"])
+        st.session_state.pop("batch_model", None)
+        st.rerun(scope="app")
+
+
+def batch_model_job(model_key, label, function, *args):
+    """The batch model for model_key, computed by function as a background job.
+
+    function returns the model's stored result ID and anything else the
+    model shows. Returns None until the job is done; only the finished
+    model is kept in the session, so other tabs never see stale results.
+    """
+    batch_model = st.session_state.get("batch_model")
+    if batch_model is not None and batch_model["key"] == model_key:
+        return batch_model
+    st.session_state.pop("batch_model", None)
+    if find_job("batch_analysis", model_key) is None or retry_requested("batch_analysis"):
+        start_job("batch_analysis", model_key, label, function, *args)
+    if not job_status("batch_analysis", model_key):
+        return None
+    batch_model = st.session_state.batch_model = {"key": model_key, **find_job("batch_analysis", model_key).result()}
+    return batch_model
+
+
+def analyse_batch(data, units, batch_params, conversion_rates, total_non_zero_units, opex_allocation, solver_target, money_rounding, progress=None):
+    # Job: P&L of every product, the solver columns and the stored results
+    batch_data = data.assign(Units=units)
+    progress(0, "Computing")
+    with timed("tab2.compute", rows=len(batch_data), exact=money_rounding is not None):
+        if money_rounding is None:
+            results_df = compute_batch(batch_data, batch_params, conversion_rates, total_non_zero_units=total_non_zero_units, opex_allocation=opex_allocation)
+        else:
+            # Money in integer cents until the total row is added
+            results_df = compute_batch_exact(batch_data, batch_params, conversion_rates, rounding=money_rounding, opex_allocation=opex_allocation)
+    solved = None
+    if solver_target is not None:
+        progress(0.4, "Solving target margins")
+        # Each product keeps its current share of the operating expenses
+        opex_share = results_df["Gross Profit (EUR)"] - results_df["Net Profit (EUR)"]
+        if money_rounding is not None:
+            opex_share = opex_share / MINOR_UNITS
+        with timed("tab2.solve", rows=len(batch_data)):
+            solved = solve_targets(batch_data, batch_params, conversion_rates, solver_target, operating_expenses_eur=opex_share.to_numpy())
+
+    # Only the ID of the stored results goes to the session; the store keeps
+    # the EUR columns and derives SAR/AED on load
+    progress(0.7, "Saving results")
+    with timed("tab2.save_results", rows=len(results_df)):
+        if money_rounding is None:
+            result_id = save_results(compact_results(with_totals(results_df, solved)), conversion_rates)
+        else:
+            # Rounded SAR/AED cents can't be derived again, so they are kept
+            result_id = save_results(compact_results(to_major_units(with_totals(results_df, solved)), keep_converted=True))
+    return {"result_id": result_id}
+
+
+def batch_results(batch_model):
+    # Shows the stored results of the batch analysis and the Excel export
+    if "shipments" in batch_model:
+        st.write("### Shipment Summary")
+        st.dataframe(batch_model["shipments"], hide_index=True)
+
+    with timed("tab2.load_results"):
+        results_df = load_batch_results(batch_model, converted=True)
+
+    # Display results
+    st.write("### Batch Analysis Results")
+    with timed("tab2.results_table", rows=len(results_df)):
+        st.dataframe(results_df)
+
+    # Exports are built only when requested, once per stored result
+    exports = [
+        ("excel", "Excel", ".xlsx", write_results_excel, "Download Results as Excel", "batch_analysis_results.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+        ("pdf", "PDF report", ".pdf", batch_pdf, "Download Report as PDF", "batch_analysis_report.pdf", "application/pdf"),
+    ]
+    for kind, name, extension, write, label, file_name, mime in exports:
+        export_path = store_path(batch_model["result_id"], extension)
+        export_key = (batch_model["result_id"], extension)
+        if not os.path.exists(export_path):
+            job = find_job(f"batch_{kind}", export_key)
+            if not job_running(job) and st.button(f"Prepare {name} download", key=f"tab2_prepare_{kind}"):
+                start_job(f"batch_{kind}", export_key, f"Building {name}", store_export, batch_model["result_id"], extension, write, retry=True)
+            job_status(f"batch_{kind}", export_key)
+
+        if os.path.exists(export_path):
+            with open(export_path, "rb") as export_file:
+                export_data = export_file.read()
+            st.download_button(label=label, data=export_data, file_name=file_name, mime=mime)
+
+
+# Several price lists at once, one per shipment: freight and FOB are spread
+# within each shipment and the operating expenses over all of them; SAR and
+# AED amounts are converted at the rates in force on each shipment's date
+def multi_shipment_batch(uploaded_files, batch_params, conversion_rates, rate_date, opex_allocation, solver_target):
+    # Parse the uploads in parallel, once per set of files
+    file_ids = tuple(uploaded_file.file_id for uploaded_file in uploaded_files)
+    shipment_files = st.session_state.get("shipment_files")
+    if shipment_files is None or shipment_files["key"] != file_ids:
+        files = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+        start_job("load_shipments", file_ids, f"Reading {len(files)} price lists", load_shipments, files)
+        if not job_status("load_shipments", file_ids):
+            st.session_state.pop("batch_model", None)
+            return None
+        shipment_files = st.session_state.shipment_files = {"key": file_ids, "data": find_job("load_shipments", file_ids).result()}
+
+    # Freight, FOB and date per shipment, starting from the inputs above
+    st.write("### Shipment Costs")
+    names = [uploaded_file.name for uploaded_file in uploaded_files]
+    costs = st.data_editor(
+        pd.DataFrame({"Shipment": names, "Shipment Date": rate_date, "Freight Cost (EUR)": batch_params["freight_cost"], "FOB Cost (EUR)": batch_params["fob_cost"]}),
+        key="shipment_costs_" + "_".join(file_ids),
+        hide_index=True,
+        use_container_width=True,
+        disabled=["Shipment"],
+        column_config={"Shipment Date": st.column_config.DateColumn("Shipment Date", min_value=first_rate_date())},
+    )
+    shipment_dates = [rate_date if pd.isna(date) else pd.Timestamp(date).date() for date in costs["Shipment Date"]]
+    freight_costs = costs["Freight Cost (EUR)"].fillna(0).astype(float).tolist()
+    fob_costs = costs["FOB Cost (EUR)"].fillna(0).astype(float).tolist()
+    shipments = list(zip(names, shipment_files["data"], freight_costs, fob_costs))
+
+    model_key = (file_ids, tuple(shipment_dates), tuple(freight_costs), tuple(fob_costs), tuple(batch_params.values()), tuple(conversion_rates.values()), opex_allocation, solver_target)
+    batch_model = batch_model_job(model_key, f"Analysing {len(shipments)} shipments", analyse_shipments, shipments, shipment_dates, rate_date, dict(batch_params), dict(conversion_rates), opex_allocation, solver_target)
+    if batch_model is None:
+        return None
+    batch_results(batch_model)
+    return model_key
+
+
+def analyse_shipments(shipments, shipment_dates, rate_date, batch_params, conversion_rates, opex_allocation, solver_target, progress=None):
+    # Job: P&L of every shipment's products, the solver columns and the
+    # stored results, with the per-shipment summary
+    progress(0, "Computing")
+    with timed("tab2.compute", shipments=len(shipments)):
+        results_df = compute_shipments(shipments, batch_params, conversion_rates, opex_allocation)
+        # Operating expenses stay at the batch's rates; every row's SAR
+        # and AED amounts use the rates of its shipment's date
+        dated = any(date != rate_date for date in shipment_dates)
+        if dated:
+            rows = [int((data["Units"] > 0).sum()) for _, data, _, _ in shipments]
+            results_df = with_dated_currency_columns(results_df, np.repeat(np.array(shipment_dates, dtype="datetime64[D]"), rows))
+    solved = None
+    if solver_target is not None:
+        progress(0.4, "Solving target margins")
+        with timed("tab2.solve", rows=len(results_df)):
+            solved = solve_shipments(shipments, results_df, batch_params, conversion_rates, solver_target)
+    progress(0.7, "Saving results")
+    with timed("tab2.save_results", rows=len(results_df)):
+        if dated:
+            # Rows converted at different rates can't be derived from one set
+            result_id = save_results(compact_results(with_totals(results_df, solved), keep_converted=True))
+        else:
+            result_id = save_results(compact_results(with_totals(results_df, solved)), conversion_rates)
+    return {"result_id": result_id, "shipments": add_total_row(shipment_summary(results_df))}
+
+
+# Batch Product Analysis tab
+# Runs as a fragment: editing units or batch inputs only reruns this tab
+@st.fragment
+@perf_fragment
+def batch_tab():
     st.header("Batch Product Analysis")
 
     # Add a state variable to store current total if it doesn't exist
@@ -620,211 +699,297 @@ with tab2:  # Batch Product Analysis tab
     admin_tab2 = st.number_input("Admin (AED)", value=0.0, format="%.2f", key="tab2_admin")
     licences_tab2 = st.number_input("Licences (AED)", value=0.0, format="%.2f", key="tab2_licences")
     depreciation_tab2 = st.number_input("Depreciation (AED)", value=0.0, format="%.2f", key="tab2_depreciation")
+    opex_allocation_tab2 = st.selectbox("Allocate Operating Expenses", list(OPEX_ALLOCATIONS), format_func=OPEX_ALLOCATIONS.get, key="tab2_opex_allocation")
+
+    # Target margin solver
+    st.subheader("Target Margin Solver")
+    col1, col2 = st.columns(2)
+    with col1:
+        solve_target_margin = st.checkbox("Solve every product for a target net margin", key="tab2_solve_target")
+    with col2:
+        target_margin_tab2 = st.number_input("Target Net Margin (%)", value=10.0, max_value=99.99, format="%.2f", key="tab2_target_margin")
 
     # File uploader
-    uploaded_file = st.file_uploader("Upload an Excel file", type=["xlsx"])
+    multi_shipment = st.checkbox("Multi-shipment mode (one file per shipment, each with its own freight and FOB)", key="tab2_multi_shipment")
+    if multi_shipment:
+        uploaded_files = st.file_uploader("Upload one file per shipment", type=["xlsx", "csv"], accept_multiple_files=True, key="tab2_shipment_files")
+        uploaded_file = None
+        streaming_mode = False
+    else:
+        uploaded_files = []
+        uploaded_file = st.file_uploader("Upload an Excel file", type=["xlsx", "csv"])
+        streaming_mode = st.checkbox("Streaming mode for very large files (units are used as uploaded)", key="tab2_streaming")
+
+    # Exact money: integer cents with explicit rounding at every step. It
+    # covers a single price list held in memory, so it is off in the
+    # multi-shipment and streaming modes
+    st.subheader("Money Arithmetic")
+    exact_available = not (multi_shipment or streaming_mode)
+    col1, col2 = st.columns(2)
+    with col1:
+        exact_money = st.checkbox("Exact money (integer cents, single price list)", key="tab2_exact_money", disabled=not exact_available) and exact_available
+    with col2:
+        rounding_tab2 = st.selectbox("Rounding", list(ROUNDING_MODES), format_func=ROUNDING_MODES.get, key="tab2_rounding", disabled=not exact_money)
+    if not exact_available:
+        st.caption("Exact money covers a single price list outside streaming mode; this run uses floating-point money.")
+
+    # Conversion rates in force on the batch's rate date
+    rate_date_tab2 = st.date_input("Exchange Rate Date", value=datetime.date.today(), min_value=first_rate_date(), key="tab2_rate_date")
+    conversion_rates = conversion_rates_on(rate_date_tab2)
+    st.caption(", ".join(f"{rate:,.4f} {currency} per EUR" for currency, rate in conversion_rates.items()))
+
+    batch_params = {
+        "markup_percentage": markup_percentage_tab2,
+        "revenue_share_percentage": revenue_share_percentage_tab2,
+        "freight_cost": freight_cost_tab2,
+        "fob_cost": fob_cost_tab2,
+        "packaging_cost": packaging_cost_tab2,
+        "warehousing_cost": warehousing_cost_tab2,
+        "salaries_aed": salaries_tab2,
+        "rental_aed": rental_tab2,
+        "utilities_aed": utilities_tab2,
+        "sales_tax_aed": sales_tax_tab2,
+        "admin_aed": admin_tab2,
+        "licences_aed": licences_tab2,
+        "depreciation_aed": depreciation_tab2,
+    }
 
-    # Conversion rates
-    conversion_rates = {"SAR": 4.11, "AED": 3.91}
+    solver_target = target_margin_tab2 if solve_target_margin else None
+    money_rounding = rounding_tab2 if exact_money else None
+    single_file = uploaded_file is not None and not streaming_mode
+    if single_file and st.session_state.get("batch_units_file") != uploaded_file.file_id:
+        # Catalogs are cached by contents across sessions; a new one is read
+        # once per upload, in the background
+        raw = uploaded_file.getvalue()
+        catalog = catalog_key(raw, uploaded_file.name)
+        data = None if find_job("read_upload", uploaded_file.file_id) else cached_catalog(catalog)
+        if data is None:
+            start_job("read_upload", uploaded_file.file_id, f"Reading {uploaded_file.name}", read_upload, raw, uploaded_file.name, catalog)
+            if job_status("read_upload", uploaded_file.file_id, cancellable=False):
+                data = find_job("read_upload", uploaded_file.file_id).result()
+        if data is not None:
+            # Keep the edited units per upload
+            st.session_state.batch_units_file = uploaded_file.file_id
+            st.session_state.batch_data = data
+            st.session_state.batch_units = data["Units"].to_numpy(copy=True)
+            st.session_state.batch_total_units = int(st.session_state.batch_units.sum())
+            st.session_state.batch_units_version = 0
+            st.session_state.units_editor_version = 0
+
+    if uploaded_files:
+        model_key = multi_shipment_batch(uploaded_files, batch_params, conversion_rates, rate_date_tab2, opex_allocation_tab2, solver_target)
+    elif uploaded_file is not None and streaming_mode:
+        model_key = None
+        st.session_state.pop("batch_model", None)
+        streaming_batch(uploaded_file, batch_params, conversion_rates, opex_allocation_tab2)
+    elif single_file and st.session_state.get("batch_units_file") == uploaded_file.file_id:
+        data = st.session_state.batch_data
+
+        # Display one paginated grid for "Units" instead of a widget per product
+        st.write("### Adjust Product Units")
+        with timed("tab2.units_editor", rows=len(data)):
+            units = units_editor(data)
+
+        # Compute the P&L for all products at once in the background, only
+        # when an input changed; the units are copied since edits change
+        # them in place
+        model_key = (uploaded_file.file_id, st.session_state.batch_units_version, tuple(batch_params.values()), tuple(conversion_rates.values()), opex_allocation_tab2, solver_target, money_rounding)
+        batch_model = batch_model_job(
+            model_key, f"Analysing {len(data):,} products", analyse_batch,
+            data, units.copy(), dict(batch_params), dict(conversion_rates), st.session_state.batch_total_units, opex_allocation_tab2, solver_target, money_rounding,
+        )
+        if batch_model is None:
+            model_key = None
+        else:
+            batch_results(batch_model)
+    else:
+        model_key = None
+        st.session_state.pop("batch_model", None)
 
-    if uploaded_file is not None:
-        # Read the uploaded Excel file
-        data = pd.read_excel(uploaded_file, usecols=[0, 1, 2], header=None)
-        data.columns = ["Product Name", "EXW Cost", "Units"]
+    # The results changed in a fragment rerun after the dashboard was drawn,
+    # so rerun the whole app to refresh it
+    if st.session_state.get("dashboard_run") == st.session_state.app_run_count and st.session_state.get("dashboard_key") != model_key:
+        st.rerun(scope="app")
 
-        # Convert columns to numeric where applicable
-        data["EXW Cost"] = pd.to_numeric(data["EXW Cost"], errors="coerce")
-        data["Units"] = pd.to_numeric(data["Units"], errors="coerce")
 
-        # Drop rows with invalid EXW costs
-        data = data.dropna(subset=["EXW Cost"])
+with tab2:
+    batch_tab()
 
-        # Display editable input fields for "Units" with side-by-side layout
-        st.write("### Adjust Product Units")
-        adjusted_units = []
-        for index, row in data.iterrows():
-            col1, col2 = st.columns([4, 1])  # Define layout: Product name wider, Units smaller
-            with col1:
-                st.write(row["Product Name"])
-            with col2:
-                new_units = st.number_input(
-                    "",
-                    min_value=0,
-                    value=int(row["Units"] if not pd.isna(row["Units"]) else 0),
-                    step=1,
-                    key=f"units_{index}",
-                    label_visibility="collapsed",
-                )
-                adjusted_units.append(new_units)
-
-        # Update the DataFrame with user inputs
-        data["Units"] = adjusted_units
-
-        # Filter out products with zero units
-        data = data[data["Units"] > 0]
-        total_non_zero_units = data["Units"].sum()
-
-        # FOB and Freight Cost Distribution
-        cost_per_unit = (freight_cost_tab2 + fob_cost_tab2) / total_non_zero_units if total_non_zero_units > 0 else 0
-
-        # Process each product
-        results = []
-
-        for _, row in data.iterrows():
-            product_name = row["Product Name"]
-            exw_cost = row["EXW Cost"]
-            units = row["Units"]
-
-            # Calculations
-            base_price = exw_cost + cost_per_unit + packaging_cost_tab2 + warehousing_cost_tab2
-            selling_price = base_price + (base_price * markup_percentage_tab2 / 100)
-            revenue_share_per_unit = selling_price * (revenue_share_percentage_tab2 / 100)
-            direct_revenue = selling_price * units
-            total_revenue_share = revenue_share_per_unit * units
-            total_revenue = direct_revenue + total_revenue_share
-
-            # COGS
-            total_cogs = (
-                (exw_cost * units)
-                + (cost_per_unit * units)
-                + (packaging_cost_tab2 * units)
-                + (warehousing_cost_tab2 * units)
-            )
-
-            # Gross Profit
-            gross_profit = total_revenue - total_cogs
-
-            # Operating Expenses in EUR
-            total_operating_expenses_aed = (
-                (salaries_tab2 + rental_tab2 + utilities_tab2) * 12
-                + sales_tax_tab2
-                + admin_tab2
-                + licences_tab2
-                + depreciation_tab2
-            )
-            total_operating_expenses_eur = total_operating_expenses_aed / conversion_rates["AED"]
-
-            # Net Profit
-            net_profit = gross_profit - total_operating_expenses_eur
-
-            # Append results for each product
-            results.append({
-                "Product Name": product_name,
-                "Number of Units": units,
-                "Selling Price per Unit (EUR)": selling_price,
-                "Selling Price per Unit (SAR)": selling_price * conversion_rates["SAR"],
-                "Selling Price per Unit (AED)": selling_price * conversion_rates["AED"],
-                "Total Revenue (EUR)": total_revenue,
-                "Total Revenue (SAR)": total_revenue * conversion_rates["SAR"],
-                "Total Revenue (AED)": total_revenue * conversion_rates["AED"],
-                "Total COGS (EUR)": total_cogs,
-                "Total COGS (SAR)": total_cogs * conversion_rates["SAR"],
-                "Total COGS (AED)": total_cogs * conversion_rates["AED"],
-                "Gross Profit (EUR)": gross_profit,
-                "Gross Profit (SAR)": gross_profit * conversion_rates["SAR"],
-                "Gross Profit (AED)": gross_profit * conversion_rates["AED"],
-                "Net Profit (EUR)": net_profit,
-                "Net Profit (SAR)": net_profit * conversion_rates["SAR"],
-                "Net Profit (AED)": net_profit * conversion_rates["AED"],
-            })
-
-        # Convert results to DataFrame
-        results_df = pd.DataFrame(results)
-
-        # Add a total row
-        total_row = {col: results_df[col].sum() if pd.api.types.is_numeric_dtype(results_df[col]) else "Total" for col in results_df.columns}
-        results_df = pd.concat([results_df, pd.DataFrame([total_row])], ignore_index=True)
-
-        # Display results
-        st.write("### Batch Analysis Results")
-        st.dataframe(results_df)
-
-        # Export results to Excel
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
-            results_df.to_excel(writer, index=False)
-            writer.close()
-        buffer.seek(0)
 
-        st.download_button(
-            label="Download Results as Excel",
-            data=buffer,
-            file_name="batch_analysis_results.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
+# In[ ]:
 
 
-# In[ ]:
+# Sensitivity of the Single Product Model to markup, units and freight,
+# evaluated over the whole grid by broadcasting and shown as a heatmap
+@st.fragment
+@perf_fragment
+def sensitivity_section():
+    st.subheader("Sensitivity Analysis (Single Product Model)")
+    default_ranges = {
+        "markup_percentage": (15.0, 30.0, 31),
+        "projected_units_sold": (10000.0, 50000.0, 41),
+        "freight_cost": (2000.0, 4000.0, 5),
+    }
+    axes = {}
+    for col, (key, (start, stop, steps)) in zip(st.columns(len(default_ranges)), default_ranges.items()):
+        with col:
+            st.markdown(f"**{SENSITIVITY_PARAMETERS[key]}**")
+            start = st.number_input("From", value=start, format="%.2f", key=f"sensitivity_{key}_from")
+            stop = st.number_input("To", value=stop, format="%.2f", key=f"sensitivity_{key}_to")
+            steps = st.number_input("Steps", min_value=1, max_value=1000, value=steps, step=1, key=f"sensitivity_{key}_steps")
+            axes[key] = np.linspace(start, stop, steps)
+    # Units are clamped the same way as the Tab 1 input
+    axes["projected_units_sold"] = np.maximum(axes["projected_units_sold"], 1)
+
+    metric = st.selectbox("Metric", list(SENSITIVITY_METRICS), format_func=SENSITIVITY_METRICS.get, key="sensitivity_metric")
+
+    points = grid_points(axes)
+    if points > MAX_GRID_POINTS:
+        st.session_state.pop("sensitivity", None)
+        st.error(f"The grid has {points:,} points (the three Steps multiplied); reduce the steps so it has at most {MAX_GRID_POINTS:,}.")
+        return
+
+    # Evaluate the grid once per scenario, ranges and metric; only the
+    # selected metric is kept in the session
+    sensitivity_key = (scenario_key(st.session_state.tab1_vars, conversion_rates), tuple((key, tuple(values)) for key, values in axes.items()), metric)
+    sensitivity = st.session_state.get("sensitivity")
+    if sensitivity is None or sensitivity["key"] != sensitivity_key:
+        with timed("tab3.sensitivity_grid", points=points):
+            grid = sensitivity_grid(st.session_state.tab1_vars, axes, conversion_rates, metrics=[metric])
+        sensitivity = st.session_state.sensitivity = {"key": sensitivity_key, "grid": grid}
+    grid = sensitivity["grid"]
+
+    freight_values = axes["freight_cost"]
+    freight_index = 0
+    if len(freight_values) > 1:
+        freight_index = st.select_slider(
+            SENSITIVITY_PARAMETERS["freight_cost"],
+            options=range(len(freight_values)),
+            format_func=lambda i: f"{freight_values[i]:,.2f}",
+            key="sensitivity_freight_index",
+        )
 
+    import plotly.graph_objects as go
+
+    fig_sensitivity = go.Figure(go.Heatmap(
+        z=grid[metric][:, :, freight_index],
+        x=axes["projected_units_sold"],
+        y=axes["markup_percentage"],
+        colorscale="RdYlGn",
+        zmid=0 if metric.startswith("net_profit") else None,
+        colorbar={"title": SENSITIVITY_METRICS[metric]},
+    ))
+    fig_sensitivity.update_layout(
+        title=f"{SENSITIVITY_METRICS[metric]} at freight {freight_values[freight_index]:,.2f} EUR",
+        xaxis_title=SENSITIVITY_PARAMETERS["projected_units_sold"],
+        yaxis_title=SENSITIVITY_PARAMETERS["markup_percentage"],
+    )
+    with timed("tab3.sensitivity_chart"):
+        st.plotly_chart(fig_sensitivity, use_container_width=True)
+
+    # The full grid with every metric as a table, built only when requested
+    if points > MAX_TABLE_POINTS:
+        st.caption(f"The sensitivity table can be exported for grids of up to {MAX_TABLE_POINTS:,} points.")
+    elif st.button("Prepare sensitivity table (CSV)", key="sensitivity_prepare_csv"):
+        table_grid = sensitivity_grid(st.session_state.tab1_vars, axes, conversion_rates, metrics=SENSITIVITY_METRICS)
+        sensitivity["csv"] = sensitivity_table(axes, table_grid).to_csv(index=False).encode("utf-8")
+    if "csv" in sensitivity:
+        st.download_button(
+            label="Download Sensitivity Table as CSV",
+            data=sensitivity["csv"],
+            file_name="sensitivity_analysis.csv",
+            mime="text/csv",
+        )
 
-# Create tabs
 
-# Assuming the data is available in the `results_df` DataFrame after analysis
-with tab3:  # Dashboard Tab
+# Dashboard tab, drawn from the batch results kept in session state
+def dashboard_tab():
     st.header("Dashboard")
 
     # Ensure the data exists before proceeding
-    if "results_df" in locals() or "results_df" in globals():
+    batch_model = st.session_state.get("batch_model")
+    if batch_model is not None:
+        with timed("tab3.load_results"):
+            results_df = load_batch_results(batch_model)
+
         # Remove the total row if present to avoid skewing the visuals
         dashboard_data = results_df[results_df["Product Name"] != "Total"]
 
         # Display Summary Metrics
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            total_revenue = dashboard_data["Total Revenue (EUR)"].sum()
-            st.metric("Total Revenue (EUR)", f"{total_revenue:,.2f}")
-        with col2:
-            total_units = dashboard_data["Number of Units"].sum()
-            st.metric("Total Units Sold", f"{int(total_units)}")
-        with col3:
-            average_profit = dashboard_data["Net Profit (EUR)"].mean()
-            st.metric("Average Net Profit (EUR)", f"{average_profit:,.2f}")
-        with col4:
-            gross_profit_margin = (dashboard_data["Gross Profit (EUR)"].sum() / total_revenue) * 100
-            st.metric("Gross Profit Margin (%)", f"{gross_profit_margin:.2f}%")
-
-        # Revenue by Product
-        st.subheader("Revenue by Product")
-        fig_revenue = px.bar(
-            dashboard_data,
-            x="Product Name",
-            y="Total Revenue (EUR)",
-            title="Revenue by Product",
-            labels={"Total Revenue (EUR)": "Revenue (EUR)", "Product Name": "Product"},
-        )
-        st.plotly_chart(fig_revenue, use_container_width=True)
-
-        # Profit by Product
-        st.subheader("Net Profit by Product")
-        fig_profit = px.bar(
-            dashboard_data,
-            x="Product Name",
-            y="Net Profit (EUR)",
-            title="Net Profit by Product",
-            labels={"Net Profit (EUR)": "Net Profit (EUR)", "Product Name": "Product"},
-        )
-        st.plotly_chart(fig_profit, use_container_width=True)
-
-        # Unit Distribution
-        st.subheader("Units Sold Distribution")
-        fig_units = px.pie(
-            dashboard_data,
-            names="Product Name",
-            values="Number of Units",
-            title="Units Sold by Product",
-        )
-        st.plotly_chart(fig_units, use_container_width=True)
-
-        # Revenue vs. COGS
-        st.subheader("Revenue vs. COGS (EUR)")
-        fig_revenue_cogs = px.line(
-            dashboard_data,
-            x="Product Name",
-            y=["Total Revenue (EUR)", "Total COGS (EUR)"],
-            title="Revenue vs. COGS",
-            labels={"value": "Amount (EUR)", "Product Name": "Product"},
-        )
-        st.plotly_chart(fig_revenue_cogs, use_container_width=True)
+        for column, (label, value) in zip(st.columns(4), dashboard_metrics(dashboard_data).items()):
+            with column:
+                st.metric(label, value)
+
+        # Aggregate to the top products so the charts stay fast with large catalogs
+        top_n = st.slider("Products shown individually", min_value=5, max_value=100, value=DEFAULT_TOP_N, step=5, key="dashboard_top_n")
+
+        # Figures are cached process-wide by the ID of the stored results
+        with timed("tab3.figures", rows=len(dashboard_data)):
+            figures = dashboard_figures(dashboard_data, batch_model["result_id"], top_n)
+
+        # Charts are serialized for the browser here
+        with timed("tab3.charts"):
+            # Revenue by Product
+            st.subheader("Revenue by Product")
+            st.plotly_chart(figures["revenue"], use_container_width=True)
+
+            # Profit by Product
+            st.subheader("Net Profit by Product")
+            st.plotly_chart(figures["profit"], use_container_width=True)
+
+            # Unit Distribution
+            st.subheader("Units Sold Distribution")
+            st.plotly_chart(figures["units"], use_container_width=True)
+
+            # Revenue vs. COGS
+            st.subheader("Revenue vs. COGS (EUR)")
+            st.plotly_chart(figures["revenue_cogs"], use_container_width=True)
     else:
         st.warning("No data available. Please perform the batch analysis first.")
 
+    sensitivity_section()
+
+    # Remember which results the dashboard shows and in which app run
+    st.session_state.dashboard_key = batch_model["key"] if batch_model is not None else None
+    st.session_state.dashboard_run = st.session_state.app_run_count
+
+
+with tab3:  # Dashboard Tab
+    with timed("dashboard_tab"):
+        dashboard_tab()
+
+
+# This session's background jobs
+if st.session_state.jobs:
+    with st.sidebar.expander("Background Jobs"):
+        for kind, key in st.session_state.jobs.items():
+            job = find_job(kind, key)
+            if job is not None:
+                st.write(f"{job.label}: {job.status_for(st.session_state.job_session)} ({job.progress:.0%})")
+
+
+# Hidden debug panel: stage timings of this session's recent runs
+end_run(app_run)
+if st.query_params.get("debug") == "perf":
+    with st.sidebar.expander("Performance", expanded=True):
+        st.caption(f"Timing records are logged to {PERF_LOG_PATH}" if PERF_LOG_PATH else "Timing log is off")
+        catalogs = catalog_cache_stats()
+        st.caption(
+            f"Price list cache: {catalogs['hits']:,} hits, {catalogs['misses']:,} misses, {catalogs['evictions']:,} evictions; "
+            f"{catalogs['catalogs']:,} catalogs in {catalogs['size_mb']:,.1f} of {catalogs['max_size_mb']:,.0f} MB"
+        )
+        for run in reversed(st.session_state.perf_runs):
+            seconds = f"{run['seconds']:.3f}s" if run["seconds"] is not None else "interrupted by a rerun"
+            st.write(f"**Run {run['id']}** ({run['label']}): {seconds}")
+            if run["records"]:
+                records = pd.DataFrame(run["records"])
+                st.dataframe(
+                    pd.DataFrame({
+                        "Stage": ["  " * depth + stage for depth, stage in zip(records["depth"], records["stage"])],
+                        "Seconds": records["seconds"],
+                        "CPU Seconds": records["cpu_seconds"],
+                        "Memory Change (MB)": records["rss_delta_mb"],
+                        "Memory (MB)": records["rss_mb"],
+                    }),
+                    hide_index=True,
+                )
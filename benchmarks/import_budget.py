@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Import-time budget for the app and the calculation core.
+#
+#   python benchmarks/import_budget.py
+#
+# Each target is imported in a fresh interpreter (best of several runs) and
+# compared to its budget. The app target runs the top-level imports of
+# Globlex1.py and also checks that the lazily imported libraries stay
+# unloaded. Exits with status 1 when a budget is exceeded.
+
+import ast
+import json
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+
+# Seconds, measured on a typical developer laptop
+BUDGETS = {
+    "core": 0.6,
+    "app": 1.2,
+}
+
+# Libraries that must only be imported when their feature is used
+# (streamlit itself imports the lightweight top-level plotly package)
+LAZY_MODULES = ["reportlab", "plotly.express", "xlsxwriter", "openpyxl"]
+
+
+def app_imports():
+    # Top-level import statements of the Streamlit script
+    with open(os.path.join(ROOT, "Globlex1.py"), encoding="utf-8") as app_file:
+        tree = ast.parse(app_file.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(source):
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"exec({source!r})\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(json.dumps({'seconds': elapsed, 'modules': sorted(sys.modules)}))\n"
+    )
+    results = []
+    for _ in range(RUNS):
+        output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.splitlines()[-1]))
+    return min(results, key=lambda result: result["seconds"])
+
+
+def main():
+    targets = {"core": "import pnl_engine", "app": app_imports()}
+    failed = False
+    for name, source in targets.items():
+        result = measure(source)
+        status = "ok" if result["seconds"] <= BUDGETS[name] else "OVER BUDGET"
+        print(f"{name:5} {result['seconds']:.3f}s (budget {BUDGETS[name]:.3f}s) {status}")
+        failed |= status != "ok"
+
+        loaded = sorted(set(result["modules"]) & set(LAZY_MODULES))
+        if loaded:
+            print(f"{name:5} eagerly imports {', '.join(loaded)}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
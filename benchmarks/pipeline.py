@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Stage-by-stage benchmark of the batch pipeline at realistic catalog sizes.
+#
+#   python benchmarks/pipeline.py
+#   python benchmarks/pipeline.py --sizes 1k 100k --repeat 3
+#   python benchmarks/pipeline.py --compare benchmarks/baselines/<commit>.json
+#
+# Synthetic price lists in the Tab 2 layout (product name, EXW cost, units;
+# no header) are generated once per size and seed and reused across runs.
+# Every stage is timed on its own, best of several runs: ingest, P&L
+# compute (float and exact money), totals row, Excel export, PDF report and
+# dashboard figures, plus the Tab 1 exports. Results are written as JSON to
+# benchmarks/baselines/ named after the current commit. With --compare, stages slower than the
+# given baseline by more than the tolerance are reported and the exit
+# status is 1.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from pnl_dashboard import DEFAULT_TOP_N, _build_figures
+from pnl_engine import DEFAULT_BATCH_PARAMS, add_total_row, compute_batch, compute_single_product, load_price_list, single_product_result, whole_units, write_results_excel
+from pnl_exact import compute_batch_exact
+from pnl_export import batch_pdf, single_product_excel, single_product_pdf
+from pnl_fx import conversion_rates_on
+
+
+# Catalog sizes (products per price list)
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+# Default runs per stage; the largest catalog is only run once
+REPEATS = {"1k": 5, "100k": 3, "1m": 1}
+
+DATA_DIR = os.environ.get("PNL_BENCHMARK_DIR", os.path.join(tempfile.gettempdir(), "pnl_benchmarks"))
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+
+# A stage regresses when it is this much slower than the baseline, and by
+# more than the noise floor in seconds
+TOLERANCE = 0.25
+NOISE_FLOOR_SECONDS = 0.05
+
+# Versions recorded with every run
+PACKAGES = ["numpy", "pandas", "openpyxl", "xlsxwriter", "reportlab", "plotly", "pyarrow"]
+
+# Conversion rates in force today, as the app uses by default
+CONVERSION_RATES = conversion_rates_on()
+
+# Tab 1 inputs for the single-product export stage (the app's defaults)
+SINGLE_PRODUCT_INPUTS = {**DEFAULT_BATCH_PARAMS, "exw_cost": 0.64, "projected_units_sold": 26250}
+
+
+def synthetic_price_list(products, seed):
+    """Price list frame with PRICE_LIST_COLUMNS.
+
+    EXW costs are log-normal around 1 EUR and about one product in ten has
+    no units, like a real catalog where part of the range isn't ordered.
+    """
+    rng = np.random.default_rng(seed)
+    exw_costs = np.round(rng.lognormal(mean=0.0, sigma=0.8, size=products), 2)
+    units = np.where(rng.random(products) < 0.1, 0, rng.integers(1, 5000, size=products))
+    return pd.DataFrame({
+        "Product Name": [f"Product {row + 1:07d}" for row in range(products)],
+        "EXW Cost": exw_costs,
+        "Units": units,
+    })
+
+
+def price_list_path(size, seed):
+    # Path of the synthetic price list for a size, written on first use
+    path = os.path.join(DATA_DIR, f"price_list_{size}_{seed}.xlsx")
+    if os.path.exists(path):
+        return path
+
+    import xlsxwriter
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    data = synthetic_price_list(SIZES[size], seed)
+    handle, temp_path = tempfile.mkstemp(dir=DATA_DIR, prefix="partial-", suffix=".xlsx")
+    os.close(handle)
+    workbook = xlsxwriter.Workbook(temp_path, {"constant_memory": True})
+    worksheet = workbook.add_worksheet()
+    for row, values in enumerate(zip(*[data[column].tolist() for column in data.columns])):
+        worksheet.write_row(row, 0, values)
+    workbook.close()
+    os.replace(temp_path, path)
+    return path
+
+
+def stages(output_dir):
+    """(name, function) of every stage, in pipeline order.
+
+    Each function takes the state left by the earlier stages and returns
+    a dict of values to add to it.
+    """
+    def ingest(state):
+        data = load_price_list(state["price_list"])
+        data["Units"] = whole_units(data["Units"])
+        return {"data": data}
+
+    def compute(state):
+        return {"results_df": compute_batch(state["data"], DEFAULT_BATCH_PARAMS, CONVERSION_RATES)}
+
+    def compute_exact(state):
+        compute_batch_exact(state["data"], DEFAULT_BATCH_PARAMS, CONVERSION_RATES)
+        return {}
+
+    def totals(state):
+        return {"with_totals": add_total_row(state["results_df"])}
+
+    def excel(state):
+        write_results_excel(state["with_totals"], os.path.join(output_dir, "results.xlsx"))
+        return {}
+
+    def pdf(state):
+        batch_pdf(state["with_totals"], os.path.join(output_dir, "results.pdf"))
+        return {}
+
+    def figures(state):
+        # Built directly, the dashboard's figure cache would hide the cost
+        _build_figures(state["results_df"], DEFAULT_TOP_N)
+        return {}
+
+    def single_product_exports(state):
+        model = compute_single_product(SINGLE_PRODUCT_INPUTS, CONVERSION_RATES)
+        result = single_product_result(SINGLE_PRODUCT_INPUTS, model, CONVERSION_RATES)
+        single_product_excel(result)
+        single_product_pdf(result)
+        return {}
+
+    return [
+        ("ingest", ingest),
+        ("compute", compute),
+        ("compute_exact", compute_exact),
+        ("totals", totals),
+        ("excel", excel),
+        ("pdf", pdf),
+        ("figures", figures),
+        ("single_product_exports", single_product_exports),
+    ]
+
+
+def run_size(size, seed, repeat, selected=None):
+    # Times of every selected stage for one catalog size
+    state = {"price_list": price_list_path(size, seed)}
+    timings = {}
+    with tempfile.TemporaryDirectory(prefix="pnl_benchmark_") as output_dir:
+        for name, function in stages(output_dir):
+            # Stages the selected ones depend on still run, once and untimed
+            timed = selected is None or name in selected
+            seconds = []
+            for _ in range(repeat if timed else 1):
+                gc.collect()
+                start = time.perf_counter()
+                produced = function(state)
+                seconds.append(time.perf_counter() - start)
+            state.update(produced)
+            if timed:
+                timings[name] = {"seconds": seconds, "best": min(seconds), "median": statistics.median(seconds)}
+                print(f"{size:5} {name:24} {min(seconds):9.3f}s", flush=True)
+    return {"products": SIZES[size], "rows": len(state.get("data", ())), "repeat": repeat, "stages": timings}
+
+
+def git_commit():
+    # Short commit of the tree being measured, marked when it has local changes
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True, capture_output=True, text=True).stdout.strip()
+        changes = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return commit + ("-dirty" if changes.strip() else "")
+
+
+def environment():
+    versions = {}
+    for package in PACKAGES:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Print best times against a baseline; return the regressed (size, stage) pairs."""
+    print(f"\ncompared to {baseline['commit']} ({baseline['created']})")
+    regressions = []
+    for size, size_results in results["sizes"].items():
+        base_stages = baseline["sizes"].get(size, {}).get("stages", {})
+        for name, timing in size_results["stages"].items():
+            if name not in base_stages:
+                continue
+            best = timing["best"]
+            base_best = base_stages[name]["best"]
+            ratio = best / base_best if base_best > 0 else float("inf")
+            regressed = ratio > 1 + tolerance and best - base_best > NOISE_FLOOR_SECONDS
+            status = "SLOWER" if regressed else ""
+            print(f"{size:5} {name:24} {base_best:9.3f}s -> {best:9.3f}s  x{ratio:5.2f} {status}")
+            if regressed:
+                regressions.append((size, name))
+    return regressions
+
+
+def parse_args(argv=None):
+    stage_names = [name for name, _ in stages(None)]
+    parser = argparse.ArgumentParser(description="Time every stage of the batch pipeline on synthetic price lists.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES), help="catalog sizes to run (default: all)")
+    parser.add_argument("--stages", nargs="+", choices=stage_names, default=None, help="stages to time (default: all)")
+    parser.add_argument("--repeat", type=int, default=None, help=f"runs per stage, best one counts (default: {REPEATS})")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic price lists (default: 0)")
+    parser.add_argument("-o", "--output", help="where to write the JSON results (default: benchmarks/baselines/<commit>.json)")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help=f"allowed slowdown before a stage counts as a regression (default: {TOLERANCE})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {
+        "commit": git_commit(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "environment": environment(),
+        "sizes": {},
+    }
+    for size in args.sizes:
+        results["sizes"][size] = run_size(size, args.seed, args.repeat or REPEATS[size], args.stages)
+
+    output = args.output or os.path.join(BASELINE_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stages slower than the baseline")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
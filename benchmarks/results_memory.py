@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Memory footprint of batch results, full versus compact.
+#
+#   python benchmarks/results_memory.py
+#   python benchmarks/results_memory.py --sizes 100k 1m --shipments 3
+#
+# For each catalog size the results with their total row are built as the
+# Batch Product Analysis tab does, then measured as a full frame (every
+# currency column) and as the compact frame kept in the results store: in
+# memory (what a session used to hold), stored on disk, and what a session
+# allocates when it loads them for the dashboard and, with the derived
+# currency columns, for display and exports. Buffers that point into the
+# memory-mapped store file are not counted, since all sessions share them.
+
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pnl_store
+from pipeline import CONVERSION_RATES, SIZES, synthetic_price_list
+from pnl_engine import DEFAULT_BATCH_PARAMS, add_total_row, compact_results, compute_batch
+from pnl_shipments import compute_shipments
+
+MB = 1024 * 1024
+
+
+def batch_results(products, shipments, seed):
+    # Results with their total row, one price list per shipment
+    data = synthetic_price_list(products, seed)
+    if shipments == 1:
+        return add_total_row(compute_batch(data, DEFAULT_BATCH_PARAMS, CONVERSION_RATES))
+    parts = [data.iloc[i::shipments] for i in range(shipments)]
+    cost = DEFAULT_BATCH_PARAMS["freight_cost"], DEFAULT_BATCH_PARAMS["fob_cost"]
+    return add_total_row(compute_shipments([(f"shipment_{i + 1}.xlsx", part, *cost) for i, part in enumerate(parts)], DEFAULT_BATCH_PARAMS, CONVERSION_RATES))
+
+
+def loaded_bytes(result_id, converted=False):
+    # Memory allocated to load stored results; pages of the memory-mapped
+    # file are not allocations, so shared columns don't count
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        results_df = pnl_store.load_results(result_id, converted=converted)
+        allocated = tracemalloc.get_traced_memory()[0] - before
+        del results_df
+        return allocated
+    finally:
+        tracemalloc.stop()
+
+
+def measure(size, shipments, seed):
+    full = batch_results(SIZES[size], shipments, seed)
+    compact = compact_results(full)
+    full_id = pnl_store.save_results(full)
+    compact_id = pnl_store.save_results(compact, CONVERSION_RATES)
+    rows = []
+    for layout, frame, result_id in [("full", full, full_id), ("compact", compact, compact_id)]:
+        rows.append({
+            "size": size,
+            "layout": layout,
+            "columns": len(frame.columns),
+            "in_memory_mb": frame.memory_usage(deep=True, index=False).sum() / MB,
+            "stored_mb": os.path.getsize(pnl_store.store_path(result_id)) / MB,
+            "loaded_mb": loaded_bytes(result_id) / MB,
+            "displayed_mb": loaded_bytes(result_id, converted=True) / MB,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the memory footprint of full and compact batch results.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES), help="catalog sizes to measure (default: all)")
+    parser.add_argument("--shipments", type=int, default=1, help="split each catalog into this many shipments (default: 1)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="pnl_results_memory_") as store_dir:
+        pnl_store.STORE_DIR = store_dir
+        print(f"{'size':5} {'layout':8} {'columns':>7} {'in memory':>12} {'stored':>12} {'loaded':>12} {'displayed':>12}")
+        for size in args.sizes:
+            rows = measure(size, args.shipments, args.seed)
+            for row in rows:
+                print(f"{row['size']:5} {row['layout']:8} {row['columns']:7} {row['in_memory_mb']:10.1f}MB {row['stored_mb']:10.1f}MB {row['loaded_mb']:10.1f}MB {row['displayed_mb']:10.1f}MB")
+            print(f"{size:5} compact is {rows[1]['in_memory_mb'] / rows[0]['in_memory_mb']:.0%} of full in memory")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
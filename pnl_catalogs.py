@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Process-wide cache of parsed price lists.
+# Uploads are keyed by a hash of their contents, so the same workbook
+# uploaded by any session is parsed once and every session shares the one
+# cleaned frame. The cache is capped in memory and evicts the least
+# recently used catalogs first.
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from pnl_engine import load_price_list, whole_units
+
+
+# Memory cap of the cached catalogs, in MB (PNL_CATALOG_CACHE_MB)
+CATALOG_CACHE_MB = float(os.environ.get("PNL_CATALOG_CACHE_MB", "512"))
+
+# {key: (data, bytes)}, least recently used first
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def catalog_key(raw, name):
+    # Contents hash of an upload; the extension picks the parser, so it counts
+    extension = os.path.splitext(str(name).lower())[1]
+    return hashlib.sha256(raw).hexdigest() + extension
+
+
+def parse_catalog(raw, name):
+    # Price list frame of an upload, cleaned and with whole units
+    data = load_price_list(io.BytesIO(raw), name)
+    data["Units"] = whole_units(data["Units"])
+    return data
+
+
+def cached_catalog(key):
+    """The cached catalog for key, or None; counts a hit or a miss.
+
+    Sessions get a shallow copy: with copy-on-write it shares the cached
+    data, and changes made to it stay in that session.
+    """
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        data = entry[0]
+        _cache.move_to_end(key)
+        _stats["hits"] += 1
+    return data.copy(deep=False)
+
+
+def cache_catalog(key, data):
+    # Keep a parsed catalog, evicting the least recently used ones over the
+    # cap; a catalog larger than the whole cap is returned but not kept
+    global _cache_bytes
+    size = int(data.memory_usage(deep=True).sum())
+    with _cache_lock:
+        if key not in _cache and size <= CATALOG_CACHE_MB * 1024 * 1024:
+            _cache[key] = (data, size)
+            _cache_bytes += size
+            while _cache_bytes > CATALOG_CACHE_MB * 1024 * 1024:
+                _, (_, evicted_size) = _cache.popitem(last=False)
+                _cache_bytes -= evicted_size
+                _stats["evictions"] += 1
+        data = _cache.get(key, (data,))[0]
+    return data.copy(deep=False)
+
+
+def load_catalog(raw, name):
+    # Parsed catalog of an upload, parsing it only if no session has yet
+    key = catalog_key(raw, name)
+    data = cached_catalog(key)
+    if data is None:
+        data = cache_catalog(key, parse_catalog(raw, name))
+    return data
+
+
+def catalog_cache_stats():
+    # Counters and size of the cache, for the debug panel
+    with _cache_lock:
+        return {
+            **_stats,
+            "catalogs": len(_cache),
+            "size_mb": _cache_bytes / (1024 * 1024),
+            "max_size_mb": CATALOG_CACHE_MB,
+        }
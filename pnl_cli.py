@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Headless batch runner: runs the Batch Product Analysis on every price list
+# in a directory, in parallel, without Streamlit.
+#
+#   python pnl_cli.py prices/ -o results/ --markup-percentage 25 --freight-cost 3000
+#   python pnl_cli.py prices/ -o results/ --config params.json --workers 8
+#   python pnl_cli.py prices/ -o results/ --exact-money --rounding half_up
+#   python pnl_cli.py prices/ -o results/ --rate-date 2024-06-30
+#
+# Each input gets a "<name>_results.xlsx" workbook identical to the
+# "Download Results as Excel" button, plus a combined "summary.xlsx" with
+# the totals row of every file.
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from pnl_engine import DEFAULT_BATCH_PARAMS, OPEX_ALLOCATIONS, add_total_row, compute_batch, load_price_list, whole_units, write_results_excel
+from pnl_exact import ROUNDING_MODES, compute_batch_exact, to_major_units
+from pnl_fx import RESULT_CURRENCIES, conversion_rates_on
+
+
+def run_file(input_path, output_dir, params, conversion_rates, opex_allocation, rounding=None):
+    # Worker: analyse one price list and write its results workbook; with a
+    # rounding mode, money is computed and totalled in integer cents
+    data = load_price_list(input_path)
+    data["Units"] = whole_units(data["Units"])
+    if rounding is None:
+        results_df = add_total_row(compute_batch(data, params, conversion_rates, opex_allocation=opex_allocation))
+    else:
+        results_df = to_major_units(add_total_row(compute_batch_exact(data, params, conversion_rates, rounding=rounding, opex_allocation=opex_allocation)))
+
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    output_path = os.path.join(output_dir, f"{name}_results.xlsx")
+    write_results_excel(results_df, output_path)
+
+    total_row = results_df.iloc[-1].to_dict()
+    total_row["Product Name"] = len(results_df) - 1
+    return {"File": os.path.basename(input_path), **total_row}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the batch P&L analysis on a directory of price lists.")
+    parser.add_argument("input_dir", help="directory containing .xlsx price lists")
+    parser.add_argument("-o", "--output-dir", default="results", help="where to write the results workbooks")
+    parser.add_argument("--config", help="JSON file with batch parameters (same keys as the flags, with underscores)")
+    parser.add_argument("--opex-allocation", choices=list(OPEX_ALLOCATIONS), default="equal", help="how operating expenses are split across products (default: equal)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--exact-money", action="store_true", help="compute money in integer cents with explicit rounding")
+    parser.add_argument("--rounding", choices=list(ROUNDING_MODES), default="half_even", help="rounding mode of --exact-money (default: half_even)")
+    for key, value in DEFAULT_BATCH_PARAMS.items():
+        parser.add_argument("--" + key.replace("_", "-"), type=float, default=None, help=f"default: {value}")
+    parser.add_argument("--rate-date", help="take the conversion rates in force on this date (YYYY-MM-DD) from the FX rates table (default: today)")
+    parser.add_argument("--fx-rates", help="FX rates table (.csv or .parquet) (default: fx_rates.csv)")
+    for currency in RESULT_CURRENCIES:
+        parser.add_argument(f"--{currency.lower()}-rate", type=float, default=None, help=f"{currency} per EUR (default: the rate on --rate-date)")
+    return parser.parse_args(argv)
+
+
+def batch_params_from_args(args):
+    # Defaults, then the config file, then explicit flags
+    params = dict(DEFAULT_BATCH_PARAMS)
+    if args.config:
+        with open(args.config, encoding="utf-8") as config_file:
+            config = json.load(config_file)
+        unknown = set(config) - set(params)
+        if unknown:
+            raise SystemExit(f"Unknown parameters in {args.config}: {', '.join(sorted(unknown))}")
+        params.update(config)
+    for key in params:
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    return params
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = batch_params_from_args(args)
+    # Rates from the FX table, as in the app, unless given explicitly
+    explicit_rates = {currency: getattr(args, f"{currency.lower()}_rate") for currency in RESULT_CURRENCIES}
+    table_currencies = [currency for currency, rate in explicit_rates.items() if rate is None]
+    try:
+        rates = conversion_rates_on(args.rate_date, table_currencies, args.fx_rates) if table_currencies else {}
+    except (OSError, ValueError) as error:
+        raise SystemExit(f"Can't take conversion rates from the FX rates table: {error}")
+    conversion_rates = {currency: rate if rate is not None else rates[currency] for currency, rate in explicit_rates.items()}
+
+    input_paths = sorted(
+        os.path.join(args.input_dir, name)
+        for name in os.listdir(args.input_dir)
+        if name.lower().endswith(".xlsx") and not name.startswith("~$")
+    )
+    if not input_paths:
+        print(f"No .xlsx files found in {args.input_dir}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    summary = []
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        rounding = args.rounding if args.exact_money else None
+        futures = {path: executor.submit(run_file, path, args.output_dir, params, conversion_rates, args.opex_allocation, rounding) for path in input_paths}
+        for path, future in futures.items():
+            try:
+                summary.append(future.result())
+                print(f"done    {path}")
+            except Exception as error:
+                failed += 1
+                print(f"failed  {path}: {error}", file=sys.stderr)
+
+    summary_df = pd.DataFrame(summary).rename(columns={"Product Name": "Products"})
+    if not summary_df.empty:
+        summary_df = add_total_row(summary_df)
+    summary_df.to_excel(os.path.join(args.output_dir, "summary.xlsx"), index=False, engine="xlsxwriter")
+    print(f"{len(summary)} files processed, {failed} failed, summary written to {args.output_dir}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
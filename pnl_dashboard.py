@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Dashboard figures for batch results of any size.
+# Products are aggregated server-side (top N plus an "Other" bucket), long
+# series are downsampled and drawn with WebGL traces, and built figures are
+# cached process-wide by the ID of the stored results.
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_TOP_N = 20
+
+# Line charts never send more points than this to the browser
+MAX_LINE_POINTS = 2000
+
+# Series longer than this are drawn with WebGL (Scattergl)
+WEBGL_THRESHOLD = 1000
+
+# Number of figure sets kept across sessions
+FIGURE_CACHE_SIZE = 16
+
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+
+def dashboard_metrics(dashboard_data):
+    # Headline figures of a batch (product rows only), formatted for display
+    total_revenue = dashboard_data["Total Revenue (EUR)"].sum()
+    return {
+        "Total Revenue (EUR)": f"{total_revenue:,.2f}",
+        "Total Units Sold": f"{int(dashboard_data['Number of Units'].sum())}",
+        "Average Net Profit (EUR)": f"{dashboard_data['Net Profit (EUR)'].mean():,.2f}",
+        "Gross Profit Margin (%)": f"{dashboard_data['Gross Profit (EUR)'].sum() / total_revenue * 100:.2f}%",
+    }
+
+
+def top_n_with_other(dashboard_data, value_column, top_n, key=None):
+    """The top_n products by key (default value_column) plus an "Other" row."""
+    key = value_column if key is None else key
+    order = np.argsort(-dashboard_data[key].to_numpy(), kind="stable")
+    top = dashboard_data.iloc[order[:top_n]][["Product Name", value_column]]
+    rest = dashboard_data.iloc[order[top_n:]]
+    if len(rest):
+        other = pd.DataFrame({"Product Name": [f"Other ({len(rest):,} products)"], value_column: [rest[value_column].sum()]})
+        top = pd.concat([top, other], ignore_index=True)
+    return top
+
+
+def downsample(values, max_points=MAX_LINE_POINTS):
+    """Bucket means of each column of values (a 2-D array) down to max_points rows.
+
+    Returns (positions, values) where positions is the mean row position
+    of each bucket.
+    """
+    positions = np.arange(len(values), dtype=float)
+    if len(values) <= max_points:
+        return positions, values
+    edges = np.linspace(0, len(values), max_points + 1).astype(int)
+    counts = np.diff(edges)[:, None]
+    bucket_sums = np.add.reduceat(values, edges[:-1], axis=0)
+    position_sums = np.add.reduceat(positions, edges[:-1])
+    return position_sums / counts[:, 0], bucket_sums / counts
+
+
+def dashboard_figures(dashboard_data, result_id, top_n=DEFAULT_TOP_N):
+    """The four dashboard figures for one results set, cached by (result_id, top_n)."""
+    cache_key = (result_id, top_n)
+    with _figure_cache_lock:
+        figures = _figure_cache.get(cache_key)
+        if figures is not None:
+            _figure_cache.move_to_end(cache_key)
+            return figures
+
+    figures = _build_figures(dashboard_data, top_n)
+    with _figure_cache_lock:
+        _figure_cache[cache_key] = figures
+        while len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
+    return figures
+
+
+def _build_figures(dashboard_data, top_n):
+    import plotly.graph_objects as go
+
+    revenue = top_n_with_other(dashboard_data, "Total Revenue (EUR)", top_n)
+    fig_revenue = go.Figure(go.Bar(x=revenue["Product Name"], y=revenue["Total Revenue (EUR)"]))
+    fig_revenue.update_layout(title="Revenue by Product", xaxis_title="Product", yaxis_title="Revenue (EUR)")
+
+    # Largest profits and losses are the interesting ones
+    ranked = dashboard_data.assign(**{"Absolute Net Profit": dashboard_data["Net Profit (EUR)"].abs()})
+    profit = top_n_with_other(ranked, "Net Profit (EUR)", top_n, key="Absolute Net Profit")
+    fig_profit = go.Figure(go.Bar(x=profit["Product Name"], y=profit["Net Profit (EUR)"]))
+    fig_profit.update_layout(title="Net Profit by Product", xaxis_title="Product", yaxis_title="Net Profit (EUR)")
+
+    units = top_n_with_other(dashboard_data, "Number of Units", top_n)
+    fig_units = go.Figure(go.Pie(labels=units["Product Name"], values=units["Number of Units"]))
+    fig_units.update_layout(title="Units Sold by Product")
+
+    # Revenue vs. COGS over products ranked by revenue, downsampled
+    ranked = dashboard_data.sort_values("Total Revenue (EUR)", ascending=False, kind="stable")
+    positions, values = downsample(ranked[["Total Revenue (EUR)", "Total COGS (EUR)"]].to_numpy(dtype=float))
+    scatter = go.Scattergl if len(positions) > WEBGL_THRESHOLD else go.Scatter
+    if len(positions) == len(ranked):
+        hover = ranked["Product Name"].astype(str).to_numpy()
+    else:
+        hover = [f"Products ranked {start + 1:,}-{end:,}" for start, end in _bucket_bounds(len(ranked), len(positions))]
+    fig_revenue_cogs = go.Figure([
+        scatter(x=positions + 1, y=values[:, 0], mode="lines", name="Total Revenue (EUR)", text=hover),
+        scatter(x=positions + 1, y=values[:, 1], mode="lines", name="Total COGS (EUR)", text=hover),
+    ])
+    fig_revenue_cogs.update_layout(title="Revenue vs. COGS", xaxis_title="Product rank by revenue", yaxis_title="Amount (EUR)")
+
+    return {"revenue": fig_revenue, "profit": fig_profit, "units": fig_units, "revenue_cogs": fig_revenue_cogs}
+
+
+def _bucket_bounds(length, buckets):
+    edges = np.linspace(0, length, buckets + 1).astype(int)
+    return zip(edges[:-1], edges[1:])
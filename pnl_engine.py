@@ -0,0 +1,486 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# P&L calculation core shared by the Streamlit app and the command-line
+# runner. It has no Streamlit dependency and only imports NumPy and pandas.
+# The batch engine computes every output column as a whole-array operation
+# instead of looping over products one at a time.
+
+import numpy as np
+import pandas as pd
+
+
+# Columns of an uploaded price list (first three columns, no header)
+PRICE_LIST_COLUMNS = ["Product Name", "EXW Cost", "Units"]
+
+# Output columns of the batch analysis, in display/export order
+RESULT_COLUMNS = [
+    "Product Name",
+    "Number of Units",
+    "Selling Price per Unit (EUR)",
+    "Selling Price per Unit (SAR)",
+    "Selling Price per Unit (AED)",
+    "Total Revenue (EUR)",
+    "Total Revenue (SAR)",
+    "Total Revenue (AED)",
+    "Total COGS (EUR)",
+    "Total COGS (SAR)",
+    "Total COGS (AED)",
+    "Gross Profit (EUR)",
+    "Gross Profit (SAR)",
+    "Gross Profit (AED)",
+    "Net Profit (EUR)",
+    "Net Profit (SAR)",
+    "Net Profit (AED)",
+]
+
+# Result columns derived from an EUR column by a conversion rate, as
+# {column: (EUR column, currency)}; compact results leave them out
+CONVERTED_COLUMNS = {
+    column: (column[:-len("(SAR)")] + "(EUR)", column[-4:-1])
+    for column in RESULT_COLUMNS
+    if column.endswith(("(SAR)", "(AED)"))
+}
+
+# Excel sheet row limit (including the header) and rows converted per step
+# when writing results
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_CHUNK_ROWS = 10_000
+
+# Ways to split the annual operating expenses across the products of a batch
+OPEX_ALLOCATIONS = {
+    "equal": "Equally per product",
+    "units": "By units",
+    "revenue": "By revenue",
+    "gross_profit": "By gross profit",
+}
+
+# Default batch parameters (same keys as the Tab 1 session variables)
+DEFAULT_BATCH_PARAMS = {
+    "markup_percentage": 21.5,
+    "revenue_share_percentage": 10.0,
+    "freight_cost": 2850.0,
+    "fob_cost": 1100.0,
+    "packaging_cost": 0.0,
+    "warehousing_cost": 0.0,
+    "salaries_aed": 0.0,
+    "rental_aed": 0.0,
+    "utilities_aed": 0.0,
+    "sales_tax_aed": 0.0,
+    "admin_aed": 0.0,
+    "licences_aed": 0.0,
+    "depreciation_aed": 0.0,
+}
+
+
+def compute_single_product(inputs, conversion_rates):
+    """Single Product Model P&L from the Tab 1 inputs (same keys as tab1_vars).
+
+    Returns a dict of every intermediate and result value; amounts are in EUR
+    unless the key ends in _aed or _sar. Inputs may also be NumPy arrays, in
+    which case every value is broadcast over them.
+    """
+    exw_cost = inputs["exw_cost"]
+    fob_cost = inputs["fob_cost"]
+    freight_cost = inputs["freight_cost"]
+    packaging_cost = inputs["packaging_cost"]
+    warehousing_cost = inputs["warehousing_cost"]
+    markup_percentage = inputs["markup_percentage"]
+    revenue_share_percentage = inputs["revenue_share_percentage"]
+    projected_units_sold = inputs["projected_units_sold"]
+
+    # Calculate Sales Price per Unit
+    base_price = exw_cost + ((freight_cost + fob_cost) / projected_units_sold) + (packaging_cost + warehousing_cost)
+    selling_price = base_price + (base_price * markup_percentage / 100)
+
+    # Revenue Share per Unit
+    revenue_share_per_unit = selling_price * (revenue_share_percentage / 100)
+
+    # Calculations for single product
+    direct_revenue = selling_price * projected_units_sold
+    total_revenue_share = revenue_share_per_unit * projected_units_sold
+    total_revenue = direct_revenue + total_revenue_share
+
+    # Cost of Goods Sold (COGS)
+    total_freight_and_logistics = freight_cost + fob_cost
+    total_cogs = (
+        (exw_cost * projected_units_sold)
+        + total_freight_and_logistics
+        + (packaging_cost * projected_units_sold)
+        + (warehousing_cost * projected_units_sold)
+    )
+
+    # Gross Profit
+    gross_profit_direct = direct_revenue - total_cogs
+    gross_profit_total = total_revenue - total_cogs
+    gross_margin_direct = profit_margin(gross_profit_direct, direct_revenue)
+    gross_margin_total = profit_margin(gross_profit_total, total_revenue)
+
+    # Operating Expenses
+    operating_expenses_aed = (
+        (inputs["salaries_aed"] * 12) + (inputs["rental_aed"] * 12) + (inputs["utilities_aed"] * 12) + inputs["sales_tax_aed"] + inputs["admin_aed"] + inputs["licences_aed"] + inputs["depreciation_aed"]
+    )
+    operating_expenses_eur = operating_expenses_aed / conversion_rates["AED"]
+    operating_expenses_sar = operating_expenses_aed / (conversion_rates["AED"] / conversion_rates["SAR"])
+
+    # Net Profit
+    net_profit_direct = gross_profit_direct - operating_expenses_eur
+    net_profit_total = gross_profit_total - operating_expenses_eur
+    net_profit_margin_direct = profit_margin(net_profit_direct, direct_revenue)
+    net_profit_margin_total = profit_margin(net_profit_total, total_revenue)
+
+    return {
+        "base_price": base_price,
+        "selling_price": selling_price,
+        "revenue_share_per_unit": revenue_share_per_unit,
+        "direct_revenue": direct_revenue,
+        "total_revenue_share": total_revenue_share,
+        "total_revenue": total_revenue,
+        "total_freight_and_logistics": total_freight_and_logistics,
+        "total_cogs": total_cogs,
+        "gross_profit_direct": gross_profit_direct,
+        "gross_profit_total": gross_profit_total,
+        "gross_margin_direct": gross_margin_direct,
+        "gross_margin_total": gross_margin_total,
+        "operating_expenses_aed": operating_expenses_aed,
+        "operating_expenses_eur": operating_expenses_eur,
+        "operating_expenses_sar": operating_expenses_sar,
+        "net_profit_direct": net_profit_direct,
+        "net_profit_total": net_profit_total,
+        "net_profit_margin_direct": net_profit_margin_direct,
+        "net_profit_margin_total": net_profit_margin_total,
+    }
+
+
+# Sections of the Single Product Model tables:
+# (name, title, source currency, rows), each row being (metric, value key, kind)
+# where kind is "money", "units" or "percent"
+SINGLE_PRODUCT_SECTIONS = [
+    ("Revenue", "Revenue and Selling Price", "EUR", [
+        ("Selling Price per Unit", "selling_price", "money"),
+        ("Number of Units Sold", "projected_units_sold", "units"),
+        ("Direct Revenue", "direct_revenue", "money"),
+        ("Revenue Share per Unit", "revenue_share_per_unit", "money"),
+        ("Revenue Share", "total_revenue_share", "money"),
+        ("Total Revenue", "total_revenue", "money"),
+    ]),
+    ("COGS", "Cost of Goods Sold (COGS)", "EUR", [
+        ("EXW Cost per Unit", "exw_cost", "money"),
+        ("Freight and Logistics Costs", "total_freight_and_logistics", "money"),
+        ("Packaging and Printing Cost per Unit", "packaging_cost", "money"),
+        ("Warehousing Cost per Unit", "warehousing_cost", "money"),
+        ("Total COGS", "total_cogs", "money"),
+    ]),
+    ("Gross Profit", "Gross Profit", "EUR", [
+        ("Gross Profit (Direct Revenue only)", "gross_profit_direct", "money"),
+        ("Gross Margin (Direct Revenue only)", "gross_margin_direct", "percent"),
+        ("Gross Profit (Direct + Revenue Share)", "gross_profit_total", "money"),
+        ("Gross Margin (Direct + Revenue Share)", "gross_margin_total", "percent"),
+    ]),
+    ("Operating Expenses", "Operating Expenses", "AED", [
+        ("Salaries", "salaries_aed", "money"),
+        ("Rental", "rental_aed", "money"),
+        ("Utilities", "utilities_aed", "money"),
+        ("Sales Tax", "sales_tax_aed", "money"),
+        ("Admin", "admin_aed", "money"),
+        ("Licences", "licences_aed", "money"),
+        ("Depreciation", "depreciation_aed", "money"),
+        ("Total Operating Expenses", "operating_expenses_aed", "money"),
+    ]),
+    ("Net Profit", "Net Profit", "EUR", [
+        ("Net Profit (Direct Revenue only)", "net_profit_direct", "money"),
+        ("Net Profit Margin (Direct Revenue only)", "net_profit_margin_direct", "percent"),
+        ("Net Profit (Direct + Revenue Share)", "net_profit_total", "money"),
+        ("Net Profit Margin (Direct + Revenue Share)", "net_profit_margin_total", "percent"),
+    ]),
+]
+
+
+def single_product_result(inputs, model, conversion_rates):
+    """Numeric Single Product Model tables in EUR and every converted currency.
+
+    Returns one frame with a row per metric (Section, Metric, Kind, Source)
+    and one column per currency, EUR first. Money is converted with a single
+    multiply against the rates vector; units repeat in every column and
+    percentages are only given in EUR.
+    """
+    values = {**inputs, **model}
+    rates = pd.Series({"EUR": 1.0, **conversion_rates})
+    result = pd.DataFrame(
+        [(name, metric, kind, source, values[key]) for name, _, source, rows in SINGLE_PRODUCT_SECTIONS for metric, key, kind in rows],
+        columns=["Section", "Metric", "Kind", "Source", "Value"],
+    )
+    kind = result["Kind"].to_numpy()
+    source = result["Source"].to_numpy()
+    value = result.pop("Value").to_numpy(dtype=float)
+    money = kind == "money"
+
+    # Money in EUR, then every currency at once
+    eur = np.where(money, value / rates[source].to_numpy(), value)
+    amounts = eur[:, None] * rates.to_numpy()[None, :]
+    for column, currency in enumerate(rates.index):
+        # Amounts entered in a currency are kept exactly as entered
+        own = money & (source == currency)
+        amounts[own, column] = value[own]
+    amounts[kind == "units"] = value[kind == "units", None]
+    amounts[kind == "percent", 1:] = np.nan
+
+    return pd.concat([result, pd.DataFrame(amounts, columns=rates.index)], axis=1)
+
+
+def section_frame(result, section):
+    # Metric plus currency columns of one section, its source currency first
+    rows = result[result["Section"] == section]
+    source = rows["Source"].iloc[0]
+    currencies = [source] + [currency for currency in result.columns[4:] if currency != source]
+    return rows[["Metric", "Kind", *currencies]].reset_index(drop=True)
+
+
+def profit_margin(profit, revenue):
+    # Profit as a percentage of revenue, 0 where there is no revenue
+    profit = np.asarray(profit, dtype=float)
+    revenue = np.asarray(revenue, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margin = np.where(revenue != 0, (profit / revenue) * 100, 0.0)
+    return margin[()] if margin.ndim == 0 else margin
+
+
+def clean_price_list(data):
+    # Name the price list columns and convert them to numeric where applicable
+    data.columns = PRICE_LIST_COLUMNS
+    data["EXW Cost"] = pd.to_numeric(data["EXW Cost"], errors="coerce")
+    data["Units"] = pd.to_numeric(data["Units"], errors="coerce")
+
+    # Drop rows with invalid EXW costs
+    return data.dropna(subset=["EXW Cost"])
+
+
+def load_price_list(source, name=None):
+    # Read the first three columns of an .xlsx or .csv price list and clean them
+    name = str(name or getattr(source, "name", source)).lower()
+    if name.endswith(".csv"):
+        data = pd.read_csv(source, usecols=[0, 1, 2], header=None)
+    else:
+        data = pd.read_excel(source, usecols=[0, 1, 2], header=None)
+    return clean_price_list(data)
+
+
+def whole_units(units):
+    # Units as non-negative integers, missing values counted as zero
+    return units.fillna(0).clip(lower=0).to_numpy(dtype="int64", copy=True)
+
+
+def batch_operating_expenses_aed(params):
+    # Annual operating expenses: monthly items x 12 plus yearly items
+    return (
+        (params["salaries_aed"] + params["rental_aed"] + params["utilities_aed"]) * 12
+        + params["sales_tax_aed"]
+        + params["admin_aed"]
+        + params["licences_aed"]
+        + params["depreciation_aed"]
+    )
+
+
+def opex_weights(opex_allocation, units, total_revenue, gross_profit):
+    # Per-product weights used to split the annual operating expenses
+    if opex_allocation == "equal":
+        return np.ones(len(units))
+    if opex_allocation == "units":
+        return units.astype(float)
+    if opex_allocation == "revenue":
+        return total_revenue
+    if opex_allocation == "gross_profit":
+        # Every product has the same markup, so gross profits share one sign
+        return np.abs(gross_profit)
+    raise ValueError(f"Unknown operating expense allocation: {opex_allocation!r}")
+
+
+def opex_weight_total(opex_allocation, product_count, total_non_zero_units, total_exw_cost, params):
+    """Catalog-wide sum of opex_weights from running totals of a price list.
+
+    total_exw_cost is the sum of EXW cost x units over products with units.
+    Lets a chunked run allocate operating expenses without a second pass.
+    """
+    if opex_allocation == "equal":
+        return product_count
+    if opex_allocation == "units":
+        return total_non_zero_units
+    cost_per_unit = (params["freight_cost"] + params["fob_cost"]) / total_non_zero_units if total_non_zero_units > 0 else 0
+    total_cogs = total_exw_cost + (cost_per_unit + params["packaging_cost"] + params["warehousing_cost"]) * total_non_zero_units
+    price_factor = (1 + params["markup_percentage"] / 100) * (1 + params["revenue_share_percentage"] / 100)
+    if opex_allocation == "revenue":
+        return total_cogs * price_factor
+    if opex_allocation == "gross_profit":
+        return abs(total_cogs * (price_factor - 1))
+    raise ValueError(f"Unknown operating expense allocation: {opex_allocation!r}")
+
+
+def compute_batch(data, params, conversion_rates, total_non_zero_units=None, opex_allocation="equal", total_opex_weight=None):
+    """Compute the batch P&L for a "Product Name" / "EXW Cost" / "Units" frame.
+
+    Products with zero units are dropped and freight/FOB is spread over the
+    remaining units. The annual operating expenses are charged once, split
+    across products by opex_allocation (see OPEX_ALLOCATIONS), so the net
+    profits add up to the company-level net profit.
+
+    Pass total_non_zero_units and total_opex_weight (see opex_weight_total)
+    when data is only one chunk of a larger price list. Returns one row per
+    product with RESULT_COLUMNS.
+    """
+    # Filter out products with zero units
+    data = data[data["Units"] > 0]
+    units = data["Units"].to_numpy()
+    exw_cost = data["EXW Cost"].to_numpy(dtype=float)
+    if total_non_zero_units is None:
+        total_non_zero_units = units.sum()
+
+    # FOB and Freight Cost Distribution
+    cost_per_unit = (params["freight_cost"] + params["fob_cost"]) / total_non_zero_units if total_non_zero_units > 0 else 0
+    packaging_cost = params["packaging_cost"]
+    warehousing_cost = params["warehousing_cost"]
+
+    # All money columns live in one (columns x products) block so the frame
+    # below can wrap it without copying
+    values = np.empty((len(RESULT_COLUMNS) - 2, len(units)))
+    (selling_price, selling_price_sar, selling_price_aed,
+     total_revenue, total_revenue_sar, total_revenue_aed,
+     total_cogs, total_cogs_sar, total_cogs_aed,
+     gross_profit, gross_profit_sar, gross_profit_aed,
+     net_profit, net_profit_sar, net_profit_aed) = values
+
+    # Calculations
+    base_price = exw_cost + cost_per_unit + packaging_cost + warehousing_cost
+    np.add(base_price, base_price * params["markup_percentage"] / 100, out=selling_price)
+    revenue_share_per_unit = selling_price * (params["revenue_share_percentage"] / 100)
+    direct_revenue = selling_price * units
+    total_revenue_share = revenue_share_per_unit * units
+    np.add(direct_revenue, total_revenue_share, out=total_revenue)
+
+    # COGS
+    np.add(
+        (exw_cost * units)
+        + (cost_per_unit * units)
+        + (packaging_cost * units),
+        (warehousing_cost * units),
+        out=total_cogs,
+    )
+
+    # Gross Profit
+    np.subtract(total_revenue, total_cogs, out=gross_profit)
+
+    # Net Profit: operating expenses (in EUR) are allocated across products
+    total_operating_expenses_eur = batch_operating_expenses_aed(params) / conversion_rates["AED"]
+    weights = opex_weights(opex_allocation, units, total_revenue, gross_profit)
+    whole_catalog = total_opex_weight is None
+    if whole_catalog:
+        total_opex_weight = weights.sum()
+    if total_opex_weight > 0:
+        opex_share = total_operating_expenses_eur * (weights / total_opex_weight)
+    else:
+        opex_share = np.full(len(units), total_operating_expenses_eur / max(len(units), 1))
+    if whole_catalog and len(units):
+        # Rounding residue goes to the largest share so the shares reconcile
+        opex_share[np.argmax(opex_share)] += total_operating_expenses_eur - opex_share.sum()
+    np.subtract(gross_profit, opex_share, out=net_profit)
+
+    # Currency conversion of every EUR column
+    for i in range(0, len(values), 3):
+        np.multiply(values[i], conversion_rates["SAR"], out=values[i + 1])
+        np.multiply(values[i], conversion_rates["AED"], out=values[i + 2])
+
+    results_df = pd.DataFrame(values.T, columns=RESULT_COLUMNS[2:], copy=False)
+    results_df.insert(0, "Product Name", data["Product Name"].array)
+    results_df.insert(1, "Number of Units", units)
+    return results_df
+
+
+def add_total_row(results_df):
+    # Sum every numeric column; label the rest "Total"
+    total_row = {col: results_df[col].sum() if pd.api.types.is_numeric_dtype(results_df[col]) else "Total" for col in results_df.columns}
+    return pd.concat([results_df, pd.DataFrame([total_row])], ignore_index=True)
+
+
+def compact_results(results_df, keep_converted=False):
+    """Results without CONVERTED_COLUMNS, in the smallest lossless dtypes.
+
+    Integer columns are downcast and text columns that repeat (such as the
+    shipment) become categorical. Product names are unique, so they keep
+    their Arrow-backed string dtype, which is already smaller than
+    categories would be. Money stays float64 so totals keep their cents.
+    with_currency_columns derives the dropped columns again; keep them
+    when they were rounded and can't be derived (exact-money results).
+    """
+    dropped = [] if keep_converted else [column for column in CONVERTED_COLUMNS if column in results_df.columns]
+    compact = results_df.drop(columns=dropped)
+    for column in compact.columns:
+        values = compact[column]
+        if pd.api.types.is_integer_dtype(values):
+            compact[column] = pd.to_numeric(values, downcast="integer")
+        elif not pd.api.types.is_numeric_dtype(values) and values.nunique() <= len(values) // 2:
+            compact[column] = values.astype("category")
+    return compact
+
+
+def with_currency_columns(results_df, conversion_rates):
+    # Results with every converted column next to its EUR column, computed
+    # the same way as compute_batch does
+    columns = {}
+    for column in results_df.columns:
+        columns[column] = results_df[column]
+        for converted, (eur_column, currency) in CONVERTED_COLUMNS.items():
+            if eur_column == column:
+                columns[converted] = results_df[column].to_numpy(dtype=float) * conversion_rates[currency]
+    return pd.DataFrame(columns, index=results_df.index, copy=False)
+
+
+def write_results_excel(results_df, output, progress=None):
+    """Same workbook as the "Download Results as Excel" button.
+
+    Rows are written in order in xlsxwriter's constant_memory mode, which
+    flushes each row to a temporary file, so memory stays flat however large
+    the results are. Pass a path as output to keep the workbook itself on
+    disk as well. Money, unit and percentage columns get number formats.
+    progress, if given, is called with the fraction of rows written.
+    """
+    import xlsxwriter
+
+    if len(results_df) >= EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(results_df):,} rows do not fit on one Excel sheet")
+
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "nan_inf_to_errors": True})
+    worksheet = workbook.add_worksheet("Sheet1")
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    for col, column in enumerate(results_df.columns):
+        # Cells written without a format take their column's format
+        num_format = _excel_number_format(column)
+        worksheet.set_column(col, col, min(max(len(column) + 2, 12), 40), workbook.add_format({"num_format": num_format}) if num_format else None)
+    worksheet.write_row(0, 0, list(results_df.columns), header_format)
+
+    row = 1
+    for start in range(0, len(results_df), EXCEL_CHUNK_ROWS):
+        if progress is not None:
+            progress(start / len(results_df), "Writing Excel rows")
+        chunk = results_df.iloc[start:start + EXCEL_CHUNK_ROWS]
+        for values in zip(*[_excel_values(chunk[column]) for column in chunk.columns]):
+            worksheet.write_row(row, 0, values)
+            row += 1
+    workbook.close()
+
+
+def _excel_number_format(column):
+    # Number format of a results column, from its name
+    for currency in ("EUR", "SAR", "AED"):
+        if column.endswith(f"({currency})"):
+            return f'#,##0.00 "{currency}"'
+    if column.endswith("(%)"):
+        return '0.00"%"'
+    if "Units" in column:
+        return "#,##0"
+    return None
+
+
+def _excel_values(column):
+    # Python values of one column chunk; missing values become blank cells
+    if column.hasnans:
+        return column.astype(object).where(column.notna(), None).tolist()
+    return column.tolist()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Exact-money engine: the batch P&L and the Single Product Model in integer
+# minor units (cents). Amounts are int64 arrays and every step that can't
+# be exact rounds explicitly with a configurable rounding mode, so the
+# column totals are exact integer sums that reconcile to the cent. It runs
+# the same whole-array operations as compute_batch, only on integers.
+
+import numpy as np
+import pandas as pd
+
+from pnl_engine import RESULT_COLUMNS, SINGLE_PRODUCT_SECTIONS, opex_weights, profit_margin
+
+
+# Minor units per EUR, SAR and AED
+MINOR_UNITS = 100
+
+# Per-unit prices are held in 1/10,000 EUR so sub-cent EXW costs survive
+PRICE_SCALE = 10_000
+
+# Conversion rates and percentages are held in millionths
+RATE_SCALE = 1_000_000
+
+# Rounding modes for every inexact step (names as in Python's decimal module)
+ROUNDING_MODES = {
+    "half_even": "Half to even (banker's rounding)",
+    "half_up": "Half away from zero",
+    "half_down": "Half toward zero",
+    "down": "Toward zero (truncate)",
+    "up": "Away from zero",
+}
+
+# Money columns of RESULT_COLUMNS (everything but the name and the units)
+MONEY_COLUMNS = RESULT_COLUMNS[2:]
+
+
+def _round_away(rounding, half, nonzero, odd):
+    # Whether a truncated magnitude goes up by one; half compares the
+    # remainder with one half (-1, 0 or 1)
+    if rounding == "half_even":
+        return (half > 0) | ((half == 0) & odd)
+    if rounding == "half_up":
+        return half >= 0
+    if rounding == "half_down":
+        return half > 0
+    if rounding == "down":
+        return np.zeros_like(nonzero)
+    if rounding == "up":
+        return nonzero
+    raise ValueError(f"Unknown rounding mode: {rounding!r}")
+
+
+def to_minor_units(amounts, scale=MINOR_UNITS, rounding="half_even"):
+    """Amounts as int64 multiples of 1/scale, rounded with the rounding mode.
+
+    Binary floats only approximate decimal prices (0.645 is stored as
+    0.64500000000000001776...), so the scaled values are snapped to six
+    decimals first and a decimal half is rounded as the mode says.
+    """
+    scaled = np.round(np.asarray(amounts, dtype=float) * scale, 6)
+    magnitude = np.abs(scaled)
+    whole = np.floor(magnitude)
+    fraction = magnitude - whole
+    up = _round_away(rounding, np.sign(fraction - 0.5), fraction > 0, whole % 2 == 1)
+    return (np.sign(scaled) * (whole + up)).astype(np.int64)
+
+
+def divide(numerator, denominator, rounding="half_even"):
+    # Integer division of int64 (or Python integer object) arrays by
+    # positive denominators, rounded
+    numerator = np.asarray(numerator)
+    if numerator.dtype != object:
+        numerator = numerator.astype(np.int64)
+    magnitude = np.abs(numerator)
+    quotient, remainder = np.floor_divide(magnitude, denominator), np.remainder(magnitude, denominator)
+    up = _round_away(rounding, np.sign(2 * remainder - denominator), remainder > 0, quotient % 2 == 1)
+    return np.sign(numerator) * (quotient + up)
+
+
+def allocate(total, weights, rounding="half_even"):
+    """Split an integer total by non-negative integer weights, exactly.
+
+    Each share is rounded with the rounding mode, then the residue is
+    handed out one minor unit at a time to the shares that rounding cut
+    the most (or added the most to), so the shares add up to total and
+    each is within one minor unit of its exact value. All zero weights
+    split the total equally.
+    """
+    weights = np.asarray(weights, dtype=np.int64)
+    if not len(weights):
+        return weights
+    # When total x weight or the sum of the weights could overflow int64,
+    # the same steps run on Python integers: slower, but still exact
+    if int(weights.max()) * max(abs(int(total)), len(weights)) >= 2 ** 62:
+        weights = weights.astype(object)
+    if weights.sum() <= 0:
+        weights = np.ones(len(weights), dtype=np.int64)
+    weight_total = int(weights.sum())
+    shares = divide(int(total) * weights, weight_total, rounding)
+
+    # What rounding took from each share, in 1/weight_total minor units
+    shortfall = int(total) * weights - shares * weight_total
+    residue = int(total) - int(shares.sum())
+    if residue > 0:
+        shares[np.argsort(-shortfall, kind="stable")[:residue]] += 1
+    elif residue < 0:
+        shares[np.argsort(shortfall, kind="stable")[:-residue]] -= 1
+    return shares.astype(np.int64)
+
+
+def compute_batch_exact(data, params, conversion_rates, rounding="half_even", opex_allocation="equal"):
+    """compute_batch for a whole price list, in integer minor units.
+
+    Returns the same rows and RESULT_COLUMNS, with every money column as
+    int64 cents (see to_major_units). The inexact steps, each rounded with
+    the rounding mode (see ROUNDING_MODES):
+
+    - EXW, packaging and warehousing costs per unit are read to 1/10,000
+      EUR and each product's cost to the cent;
+    - freight and FOB are split across products by units, and operating
+      expenses by opex_allocation, so the shares add up exactly (see
+      allocate);
+    - direct revenue is the product's cost plus markup and the revenue
+      share a percentage of it, each to the cent; the selling price per
+      unit is direct revenue over units, to the cent;
+    - every EUR amount is converted to SAR and AED to the cent.
+    """
+    # Filter out products with zero units
+    data = data[data["Units"] > 0]
+    units = data["Units"].to_numpy(dtype=np.int64)
+
+    def cents(amount):
+        return int(to_minor_units(amount, MINOR_UNITS, rounding))
+
+    def rate(value, scale=RATE_SCALE):
+        return int(to_minor_units(value, scale, rounding))
+
+    # COGS: costs per unit times units, plus the product's freight/FOB share
+    unit_costs = to_minor_units(data["EXW Cost"].to_numpy(dtype=float), PRICE_SCALE, rounding)
+    unit_costs += int(to_minor_units(params["packaging_cost"], PRICE_SCALE, rounding)) + int(to_minor_units(params["warehousing_cost"], PRICE_SCALE, rounding))
+    freight_share = allocate(cents(params["freight_cost"]) + cents(params["fob_cost"]), units, rounding)
+
+    values = np.empty((len(MONEY_COLUMNS), len(units)), dtype=np.int64)
+    (selling_price, _, _,
+     total_revenue, _, _,
+     total_cogs, _, _,
+     gross_profit, _, _,
+     net_profit, _, _) = values
+    total_cogs[:] = divide(unit_costs * units, PRICE_SCALE // MINOR_UNITS, rounding) + freight_share
+
+    # Revenue: cost plus markup, then the revenue share on top
+    markup = rate(params["markup_percentage"], RATE_SCALE // 100)
+    revenue_share = rate(params["revenue_share_percentage"], RATE_SCALE // 100)
+    direct_revenue = divide(total_cogs * (RATE_SCALE + markup), RATE_SCALE, rounding)
+    selling_price[:] = divide(direct_revenue, units, rounding)
+    total_revenue[:] = direct_revenue + divide(direct_revenue * revenue_share, RATE_SCALE, rounding)
+
+    # Gross Profit
+    np.subtract(total_revenue, total_cogs, out=gross_profit)
+
+    # Net Profit: operating expenses (AED) in EUR cents, split exactly
+    opex_aed = (
+        (cents(params["salaries_aed"]) + cents(params["rental_aed"]) + cents(params["utilities_aed"])) * 12
+        + cents(params["sales_tax_aed"])
+        + cents(params["admin_aed"])
+        + cents(params["licences_aed"])
+        + cents(params["depreciation_aed"])
+    )
+    opex_eur = int(divide(opex_aed * RATE_SCALE, rate(conversion_rates["AED"]), rounding))
+    weights = opex_weights(opex_allocation, units, total_revenue, gross_profit)
+    np.subtract(gross_profit, allocate(opex_eur, np.asarray(weights, dtype=np.int64), rounding), out=net_profit)
+
+    # Currency conversion of every EUR column, to the cent
+    sar_rate = rate(conversion_rates["SAR"])
+    aed_rate = rate(conversion_rates["AED"])
+    for i in range(0, len(values), 3):
+        values[i + 1] = divide(values[i] * sar_rate, RATE_SCALE, rounding)
+        values[i + 2] = divide(values[i] * aed_rate, RATE_SCALE, rounding)
+
+    results_df = pd.DataFrame(values.T, columns=MONEY_COLUMNS, copy=False)
+    results_df.insert(0, "Product Name", data["Product Name"].to_numpy())
+    results_df.insert(1, "Number of Units", units)
+    return results_df
+
+
+def single_product_exact(inputs, conversion_rates, rounding="half_even"):
+    """single_product_result for the Tab 1 inputs, computed in integer cents.
+
+    The steps are those of compute_batch_exact for one product sold in the
+    projected units, so its amounts match a one-product batch. Every money
+    amount in every currency is rounded to the cent with the rounding mode,
+    converted from its source currency with one rounding; amounts entered
+    in a currency are kept as entered there. Returns the same frame as
+    single_product_result, with money in major units.
+    """
+    units = max(1, int(inputs["projected_units_sold"]))
+
+    def cents(amount):
+        return int(to_minor_units(amount, MINOR_UNITS, rounding))
+
+    def rate(value, scale=RATE_SCALE):
+        return int(to_minor_units(value, scale, rounding))
+
+    def exact_divide(numerator, denominator):
+        return int(divide(np.array([numerator], dtype=object), denominator, rounding)[0])
+
+    # Per-unit costs in 1/10,000 EUR, everything else in cents
+    exw_cost = int(to_minor_units(inputs["exw_cost"], PRICE_SCALE, rounding))
+    packaging_cost = int(to_minor_units(inputs["packaging_cost"], PRICE_SCALE, rounding))
+    warehousing_cost = int(to_minor_units(inputs["warehousing_cost"], PRICE_SCALE, rounding))
+    total_freight_and_logistics = cents(inputs["freight_cost"]) + cents(inputs["fob_cost"])
+    total_cogs = exact_divide((exw_cost + packaging_cost + warehousing_cost) * units, PRICE_SCALE // MINOR_UNITS) + total_freight_and_logistics
+
+    # Revenue: cost plus markup, then the revenue share on top
+    direct_revenue = exact_divide(total_cogs * (RATE_SCALE + rate(inputs["markup_percentage"], RATE_SCALE // 100)), RATE_SCALE)
+    total_revenue_share = exact_divide(direct_revenue * rate(inputs["revenue_share_percentage"], RATE_SCALE // 100), RATE_SCALE)
+    total_revenue = direct_revenue + total_revenue_share
+    gross_profit_direct = direct_revenue - total_cogs
+    gross_profit_total = total_revenue - total_cogs
+
+    # Operating expenses are entered in AED
+    opex = {key: cents(inputs[key]) for key in ["salaries_aed", "rental_aed", "utilities_aed", "sales_tax_aed", "admin_aed", "licences_aed", "depreciation_aed"]}
+    operating_expenses_aed = (opex["salaries_aed"] + opex["rental_aed"] + opex["utilities_aed"]) * 12 + opex["sales_tax_aed"] + opex["admin_aed"] + opex["licences_aed"] + opex["depreciation_aed"]
+    rates = {"EUR": RATE_SCALE, **{currency: rate(value) for currency, value in conversion_rates.items()}}
+    operating_expenses_eur = exact_divide(operating_expenses_aed * RATE_SCALE, rates["AED"])
+    net_profit_direct = gross_profit_direct - operating_expenses_eur
+    net_profit_total = gross_profit_total - operating_expenses_eur
+
+    # Money as (amount, minor units per major unit, source currency)
+    money = {
+        "selling_price": (exact_divide(direct_revenue, units), MINOR_UNITS, "EUR"),
+        "direct_revenue": (direct_revenue, MINOR_UNITS, "EUR"),
+        "revenue_share_per_unit": (exact_divide(total_revenue_share, units), MINOR_UNITS, "EUR"),
+        "total_revenue_share": (total_revenue_share, MINOR_UNITS, "EUR"),
+        "total_revenue": (total_revenue, MINOR_UNITS, "EUR"),
+        "exw_cost": (exw_cost, PRICE_SCALE, "EUR"),
+        "total_freight_and_logistics": (total_freight_and_logistics, MINOR_UNITS, "EUR"),
+        "packaging_cost": (packaging_cost, PRICE_SCALE, "EUR"),
+        "warehousing_cost": (warehousing_cost, PRICE_SCALE, "EUR"),
+        "total_cogs": (total_cogs, MINOR_UNITS, "EUR"),
+        "gross_profit_direct": (gross_profit_direct, MINOR_UNITS, "EUR"),
+        "gross_profit_total": (gross_profit_total, MINOR_UNITS, "EUR"),
+        **{key: (amount, MINOR_UNITS, "AED") for key, amount in opex.items()},
+        "operating_expenses_aed": (operating_expenses_aed, MINOR_UNITS, "AED"),
+        "net_profit_direct": (net_profit_direct, MINOR_UNITS, "EUR"),
+        "net_profit_total": (net_profit_total, MINOR_UNITS, "EUR"),
+    }
+    other = {
+        "projected_units_sold": units,
+        "gross_margin_direct": profit_margin(gross_profit_direct, direct_revenue),
+        "gross_margin_total": profit_margin(gross_profit_total, total_revenue),
+        "net_profit_margin_direct": profit_margin(net_profit_direct, direct_revenue),
+        "net_profit_margin_total": profit_margin(net_profit_total, total_revenue),
+    }
+
+    result = pd.DataFrame(
+        [(name, metric, kind, source, key) for name, _, source, rows in SINGLE_PRODUCT_SECTIONS for metric, key, kind in rows],
+        columns=["Section", "Metric", "Kind", "Source", "Key"],
+    )
+    keys = result.pop("Key").tolist()
+    is_money = (result["Kind"] == "money").to_numpy()
+    amounts = np.array([money[key][0] if key in money else 0 for key in keys], dtype=object)
+    scales = np.array([money[key][1] if key in money else MINOR_UNITS for key in keys], dtype=object)
+    source_rates = np.array([rates[money[key][2]] if key in money else RATE_SCALE for key in keys], dtype=object)
+    sources = np.array([money[key][2] if key in money else "" for key in keys])
+    for currency, currency_rate in rates.items():
+        # Every money row converted at once, rounded to the cent
+        converted = divide(amounts * currency_rate, source_rates * (scales // MINOR_UNITS), rounding).astype(float) / MINOR_UNITS
+        own = sources == currency
+        converted[own] = (amounts[own] / scales[own]).astype(float)
+        column = np.where(is_money, converted, np.nan)
+        for row, key in enumerate(keys):
+            if key in other and (currency == "EUR" or result["Kind"][row] == "units"):
+                column[row] = other[key]
+        result[currency] = column
+    return result
+
+
+def to_major_units(results_df):
+    # Integer money columns (cents) as amounts; other columns are kept
+    converted = {
+        column: results_df[column] / MINOR_UNITS
+        for column in MONEY_COLUMNS
+        if column in results_df.columns and pd.api.types.is_integer_dtype(results_df[column])
+    }
+    return results_df.assign(**converted) if converted else results_df
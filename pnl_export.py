@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Excel and PDF exports of the Single Product Model, and the batch PDF report.
+# Exports are built on request in a worker thread and cached per scenario,
+# so repeated downloads of the same inputs are served without rebuilding.
+
+import contextvars
+import functools
+import hashlib
+import io
+import itertools
+import json
+import textwrap
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from pnl_dashboard import dashboard_metrics, top_n_with_other
+from pnl_engine import SINGLE_PRODUCT_SECTIONS, section_frame
+from pnl_perf import timed
+
+
+# Number of built exports kept in memory across sessions
+EXPORT_CACHE_SIZE = 32
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="export")
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def scenario_key(inputs, conversion_rates):
+    # Stable hash of everything an export depends on
+    payload = json.dumps([inputs, conversion_rates], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def submit_export(kind, key, build, *args):
+    """Return a Future for build(*args), reusing the cached one for (kind, key)."""
+    with _cache_lock:
+        future = _cache.get((kind, key))
+        if future is None or (future.done() and future.exception() is not None):
+            future = _executor.submit(contextvars.copy_context().run, _timed_build, kind, build, args)
+            _cache[(kind, key)] = future
+        _cache.move_to_end((kind, key))
+        while len(_cache) > EXPORT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return future
+
+
+def _timed_build(kind, build, args):
+    with timed(f"export.{kind}"):
+        return build(*args)
+
+
+def cached_export(kind, key):
+    # Finished export for (kind, key), or None if it hasn't been built yet
+    with _cache_lock:
+        future = _cache.get((kind, key))
+    if future is None or not future.done() or future.exception() is not None:
+        return None
+    return future.result()
+
+
+def format_section(result, section):
+    """Display strings of one Single Product Model section, for st.table and PDF."""
+    frame = section_frame(result, section)
+    table = {"Metric": frame["Metric"].tolist()}
+    for currency in frame.columns[2:]:
+        table[currency] = [_format_value(value, kind, currency) for value, kind in zip(frame[currency], frame["Kind"])]
+    return table
+
+
+def _format_value(value, kind, currency):
+    if kind == "units":
+        return f"{value:,.0f} units"
+    if kind == "percent":
+        return "-" if pd.isna(value) else f"{value:.2f}%"
+    return f"{value:,.2f} {currency}"
+
+
+def single_product_excel(result):
+    # One sheet per section holding numbers, formatted per row kind
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="xlsxwriter") as writer:
+        row_formats = {
+            "money": writer.book.add_format({"num_format": "#,##0.00"}),
+            "units": writer.book.add_format({"num_format": "#,##0"}),
+            "percent": writer.book.add_format({"num_format": '0.00"%"'}),
+        }
+        for name, *_ in SINGLE_PRODUCT_SECTIONS:
+            frame = section_frame(result, name)
+            frame.drop(columns="Kind").to_excel(writer, index=False, sheet_name=name)
+            worksheet = writer.sheets[name]
+            worksheet.set_column(0, 0, 42)
+            worksheet.set_column(1, len(frame.columns) - 2, 16)
+            for row, kind in enumerate(frame["Kind"], start=1):
+                worksheet.set_row(row, None, row_formats[kind])
+    return buffer.getvalue()
+
+
+@functools.lru_cache(maxsize=None)
+def _pdf_styles():
+    # reportlab styles are built once per process
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+
+    # Custom style for main header
+    main_header_style = styles['Heading1'].clone('MainHeader')
+    main_header_style.textColor = colors.HexColor('#000080')
+    main_header_style.alignment = 1
+    main_header_style.spaceAfter = 20
+    main_header_style.fontSize = 16
+
+    # Smaller heading style for table titles
+    heading_style = styles['Heading3'].clone('TableHeading')
+    heading_style.fontSize = 10
+    heading_style.spaceAfter = 4
+
+    table_style = TableStyle([
+        # Header style
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#000080')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 7),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 4),
+        # Data rows style
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 6),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+    return main_header_style, heading_style, table_style
+
+
+def single_product_pdf(result):
+    # P&L report with one titled table per section
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
+
+    main_header_style, heading_style, table_style = _pdf_styles()
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = [Paragraph("P&L Globlex LLC-FZ", main_header_style)]
+
+    for name, title, *_ in SINGLE_PRODUCT_SECTIONS:
+        elements.append(Paragraph(title, heading_style))
+        data = format_section(result, name)
+
+        # Convert dictionary to list of lists for the table
+        table_data = [list(data.keys())]  # Headers
+        for i in range(len(list(data.values())[0])):
+            table_data.append([data[col][i] for col in data.keys()])
+
+        # 40% of the approximate available width for the first column, the rest shared
+        available_width = 500
+        currency_count = len(data) - 1
+        col_widths = [available_width * 0.4] + [available_width * 0.6 / currency_count] * currency_count
+
+        table = Table(table_data, colWidths=col_widths, repeatRows=1)
+        table.setStyle(table_style)
+        elements.append(table)
+        elements.append(Spacer(1, 8))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+
+# Longest product or shipment name shown in a batch report row
+TEXT_MAX_CHARS = 28
+
+
+class _FlowableStream(list):
+    # List view of a flowable generator for reportlab's build loop, filled
+    # as flowables are consumed, so only the current page exists at a time
+    def __init__(self, flowables):
+        super().__init__()
+        self._flowables = iter(flowables)
+
+    def _fill(self):
+        if not list.__len__(self):
+            self.extend(itertools.islice(self._flowables, 1))
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+
+def batch_pdf(results_df, output, title="Batch Analysis Report", progress=None):
+    """Landscape PDF report of batch results (with their total row) written to output.
+
+    Summary pages with the dashboard totals come first, then every result
+    row, one table per page with the column headers repeated. Pages of rows
+    are formatted only when reportlab reaches them. progress, if given, is
+    called with the fraction of rows laid out.
+    """
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+    main_header_style, heading_style, table_style = _pdf_styles()
+    doc = SimpleDocTemplate(output, pagesize=landscape(A4), leftMargin=30, rightMargin=30, topMargin=30, bottomMargin=30, title=title)
+    products = results_df[results_df["Product Name"] != "Total"]
+
+    def summary_table(frame, widths):
+        table = Table([list(frame.columns), *zip(*[_pdf_column(frame[column]) for column in frame.columns])], colWidths=widths, repeatRows=1)
+        table.setStyle(table_style)
+        return table
+
+    elements = [Paragraph(title, main_header_style), Paragraph("Summary", heading_style)]
+    totals = dict(dashboard_metrics(products))
+    totals["Products"] = f"{len(products):,}"
+    for column in ["Total COGS (EUR)", "Gross Profit (EUR)", "Net Profit (EUR)"]:
+        totals[column] = f"{products[column].sum():,.2f}"
+    elements.append(summary_table(pd.DataFrame({"Metric": list(totals), "Value": list(totals.values())}), [200, 150]))
+
+    if "Shipment" in results_df.columns:
+        from pnl_shipments import shipment_summary
+
+        shipments = shipment_summary(products)[["Shipment", "Products", "Number of Units", "Total Revenue (EUR)", "Total COGS (EUR)", "Gross Profit (EUR)", "Net Profit (EUR)"]]
+        elements += [Spacer(1, 12), Paragraph("Shipments", heading_style), summary_table(shipments, [160] + [90] * 6)]
+
+    for column, heading in [("Total Revenue (EUR)", "Top Products by Revenue"), ("Net Profit (EUR)", "Top Products by Net Profit")]:
+        top = top_n_with_other(products, column, 10)
+        elements += [Spacer(1, 12), Paragraph(heading, heading_style), summary_table(top, [300, 120])]
+
+    # Result pages: right-aligned numbers, text columns wider
+    columns = list(results_df.columns)
+    text_columns = [i for i, column in enumerate(columns) if not pd.api.types.is_numeric_dtype(results_df[column])]
+    weights = [1.5 if i in text_columns else 1.0 for i in range(len(columns))]
+    col_widths = [doc.width * weight / sum(weights) for weight in weights]
+    style = TableStyle(
+        [
+            ("FONTSIZE", (0, 1), (-1, -1), 5.5),
+            ("LEADING", (0, 1), (-1, -1), 7),
+            ("TOPPADDING", (0, 1), (-1, -1), 1.5),
+            ("BOTTOMPADDING", (0, 1), (-1, -1), 1.5),
+            ("LEFTPADDING", (0, 0), (-1, -1), 2),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 2),
+        ]
+        + [("ALIGN", (i, 1), (i, -1), "RIGHT") for i in range(len(columns)) if i not in text_columns],
+        parent=table_style,
+    )
+    header = [textwrap.fill(column, 14) for column in columns]
+
+    def page_table(rows):
+        table = Table([header, *rows], colWidths=col_widths, repeatRows=1)
+        table.setStyle(style)
+        return table
+
+    # Rows per page from the measured header and row heights (the page
+    # frame keeps 6pt of padding above and below)
+    frame_height = doc.height - 12
+    sample = list(zip(*[_pdf_column(results_df[column].iloc[:1], TEXT_MAX_CHARS) for column in columns]))
+    header_height = page_table([]).wrap(doc.width, frame_height)[1]
+    row_height = page_table(sample).wrap(doc.width, frame_height)[1] - header_height
+    rows_per_page = max(1, int((frame_height - header_height) // row_height))
+
+    def result_pages():
+        yield from elements
+        for start in range(0, len(results_df), rows_per_page):
+            if progress is not None:
+                progress(start / len(results_df), "Laying out PDF pages")
+            chunk = results_df.iloc[start:start + rows_per_page]
+            yield PageBreak()
+            yield page_table(list(zip(*[_pdf_column(chunk[column], TEXT_MAX_CHARS) for column in columns])))
+
+    doc.build(_FlowableStream(result_pages()), onFirstPage=_draw_page_number, onLaterPages=_draw_page_number)
+
+
+def _pdf_column(column, max_chars=None):
+    # Display strings of one column: money totals in whole units, prices and
+    # percentages with two decimals, missing values as "-"
+    if not pd.api.types.is_numeric_dtype(column):
+        text = column.astype(str)
+        if max_chars is not None:
+            text = text.where(text.str.len() <= max_chars, text.str.slice(0, max_chars - 3) + "...")
+        return text.tolist()
+    name = str(column.name)
+    if "Units" in name:
+        pattern = "{:,.0f}"
+    elif "per Unit" in name or "(%)" in name or "Max EXW Cost" in name:
+        pattern = "{:,.2f}"
+    else:
+        pattern = "{:,.0f}"
+    return ["-" if pd.isna(value) else pattern.format(value) for value in column.tolist()]
+
+
+def _draw_page_number(canvas, doc):
+    canvas.saveState()
+    canvas.setFont("Helvetica", 7)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, doc.bottomMargin / 2, f"Page {doc.page}")
+    canvas.restoreState()
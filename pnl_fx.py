@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Foreign exchange rates from a local table of dated rates.
+# The table (CSV or Parquet) has one row per currency and date with the
+# rate in units of that currency per EUR, in force from its date until the
+# currency's next rate. It is read once per version of the file and kept in
+# process; conversion matches every date to the rate in force on it with a
+# binary search over the currency's dates, as one array operation.
+
+import datetime
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from pnl_engine import CONVERTED_COLUMNS, with_currency_columns
+
+
+# Columns of the rates table
+RATE_COLUMNS = ["Date", "Currency", "Rate"]
+
+# Rates table used when no path is given
+RATES_PATH = os.environ.get("PNL_FX_RATES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fx_rates.csv"))
+
+# Currencies of the result columns
+RESULT_CURRENCIES = list(dict.fromkeys(currency for _, currency in CONVERTED_COLUMNS.values()))
+
+# Parsed tables by path, with the modification time and size they were read at
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _read_rates(path):
+    # Rates table as {currency: (dates, rates)}, dates ascending as datetime64[D]
+    if path.lower().endswith(".parquet"):
+        table = pd.read_parquet(path, columns=RATE_COLUMNS)
+    else:
+        table = pd.read_csv(path, usecols=RATE_COLUMNS)
+    missing = table[RATE_COLUMNS].isna().any(axis=1)
+    if missing.any():
+        raise ValueError(f"{path}: incomplete rate on row {int(np.argmax(missing.to_numpy())) + 1}")
+    table = pd.DataFrame({
+        "Date": pd.to_datetime(table["Date"]).to_numpy(dtype="datetime64[D]"),
+        "Currency": table["Currency"].astype(str).str.strip().str.upper(),
+        "Rate": pd.to_numeric(table["Rate"]).to_numpy(dtype=float),
+    })
+    if (table["Rate"] <= 0).any():
+        raise ValueError(f"{path}: rates must be positive")
+
+    # A later row for the same currency and date replaces an earlier one
+    table = table.drop_duplicates(["Currency", "Date"], keep="last").sort_values(["Currency", "Date"])
+    return {
+        currency: (rates["Date"].to_numpy(dtype="datetime64[D]"), rates["Rate"].to_numpy())
+        for currency, rates in table.groupby("Currency", sort=True)
+    }
+
+
+def rate_table(path=None):
+    """Dated rates of a table as {currency: (dates, rates)}, cached in process.
+
+    The file is read again only after it changes on disk, so lookups cost
+    a stat call once it is loaded.
+    """
+    path = os.path.abspath(path or RATES_PATH)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _tables_lock:
+        cached = _tables.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    rates = _read_rates(path)
+    with _tables_lock:
+        _tables[path] = (version, rates)
+    return rates
+
+
+def _dates(dates):
+    # Dates (scalar, sequence, array or Series) as a datetime64[D] array
+    if dates is None:
+        dates = datetime.date.today()
+    if np.ndim(dates) == 0:
+        dates = [dates]
+    if isinstance(dates, np.ndarray) and np.issubdtype(dates.dtype, np.datetime64):
+        return dates.astype("datetime64[D]")
+    return pd.to_datetime(dates).to_numpy(dtype="datetime64[D]")
+
+
+def rates_as_of(currency, dates, path=None):
+    """Rate of currency in force on each of dates, as a float array.
+
+    Raises ValueError for an unknown currency or a date before its first rate.
+    """
+    table = rate_table(path)
+    if currency not in table:
+        raise ValueError(f"No {currency} rates in {path or RATES_PATH}")
+    rate_dates, rates = table[currency]
+    dates = _dates(dates)
+    positions = np.searchsorted(rate_dates, dates, side="right") - 1
+    if len(positions) and positions.min() < 0:
+        raise ValueError(f"No {currency} rate before {rate_dates[0]} (asked for {dates.min()})")
+    return rates[positions]
+
+
+def conversion_rates_on(date=None, currencies=None, path=None):
+    # {currency: rate} in force on a date (default: today), for the
+    # given currencies (default: those of the result columns)
+    return {currency: float(rates_as_of(currency, date, path)[0]) for currency in currencies or RESULT_CURRENCIES}
+
+
+def first_rate_date(currencies=None, path=None):
+    # Earliest date every one of currencies has a rate for
+    table = rate_table(path)
+    return max(table[currency][0][0] for currency in currencies or RESULT_CURRENCIES).astype(datetime.date)
+
+
+def dated_rates(dates, currencies=None, path=None):
+    # {currency: array of the rate in force on each of dates}; usable as
+    # per-row conversion_rates where rates multiply whole columns
+    dates = _dates(dates)
+    return {currency: rates_as_of(currency, dates, path) for currency in currencies or RESULT_CURRENCIES}
+
+
+def with_dated_currency_columns(results_df, dates, path=None):
+    # results_df with every SAR/AED column converted at the rate in force
+    # on its row's date (one date per row)
+    eur_columns = results_df.drop(columns=[column for column in CONVERTED_COLUMNS if column in results_df.columns])
+    return with_currency_columns(eur_columns, dated_rates(dates, path=path))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Background jobs for long-running work (parsing, batch analyses, streaming
+# runs, exports, simulations). A job runs in a worker thread and gets a
+# progress callback; once the job is cancelled, its next progress report
+# raises JobCancelled. Jobs are shared process-wide by (kind, key), so
+# coming back to the same inputs reuses a running or finished job instead
+# of starting over; a failed or cancelled job stays so until it is retried.
+# Sessions subscribe to the jobs they show: cancelling only detaches the
+# session, and the job stops once no other session follows it. Jobs run in
+# a copy of the submitter's context, so their timings are reported to the
+# run that started them.
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from pnl_perf import timed
+
+
+JOB_WORKERS = 4
+
+# Finished jobs (and their results) kept across sessions
+JOB_HISTORY_SIZE = 32
+
+# Seconds after which a session that stopped polling a job no longer
+# keeps it running
+SUBSCRIBER_TIMEOUT = 60
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+class JobCancelled(Exception):
+    """Raised from a job's progress callback after the job was cancelled."""
+
+
+class Job:
+    def __init__(self, label):
+        self.label = label
+        self.progress = 0.0
+        self.message = ""
+        self.started = time.time()
+        self.future = None
+        self.cleanup = None
+        self._cancel_requested = threading.Event()
+        # {session: last time it followed the job}, and the sessions that
+        # cancelled it
+        self._subscribers = {}
+        self._detached = set()
+        self._lock = threading.Lock()
+
+    def report(self, fraction, message=None):
+        # Progress callback passed to the job's function
+        if self._cancel_requested.is_set():
+            raise JobCancelled(self.label)
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def subscribe(self, session, retry=False):
+        # Count session as following the job; a session that cancelled it
+        # stays detached unless it retries
+        with self._lock:
+            if retry:
+                self._detached.discard(session)
+            if session not in self._detached:
+                self._subscribers[session] = time.monotonic()
+
+    def cancel(self, session=None):
+        """Cancel the job for session, or for everyone without a session.
+
+        The job itself only stops once no other session has followed it in
+        the last SUBSCRIBER_TIMEOUT seconds; until then the session is just
+        detached from it and sees it as cancelled.
+        """
+        with self._lock:
+            if session is not None:
+                self._subscribers.pop(session, None)
+                self._detached.add(session)
+                now = time.monotonic()
+                if any(now - seen < SUBSCRIBER_TIMEOUT for seen in self._subscribers.values()):
+                    return
+            self._cancel_requested.set()
+        self.future.cancel()
+
+    def status_for(self, session):
+        # status as seen by session: "cancelled" once it cancelled the job
+        with self._lock:
+            if session in self._detached:
+                return "cancelled"
+        return self.status
+
+    @property
+    def status(self):
+        # "running", "cancelling", "done", "failed" or "cancelled"
+        if not self.future.done():
+            return "cancelling" if self._cancel_requested.is_set() else "running"
+        if self.future.cancelled() or isinstance(self.future.exception(), JobCancelled):
+            return "cancelled"
+        return "failed" if self.future.exception() is not None else "done"
+
+    @property
+    def active(self):
+        return not self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+
+def submit_job(kind, key, label, function, *args, session=None, retry=False, cleanup=None, **kwargs):
+    """Run function(*args, progress=job.report, **kwargs) in the background.
+
+    Returns the job for (kind, key), reusing an existing one, and subscribes
+    session to it. A failed or cancelled job is returned as it is unless
+    retry is set, which also attaches a session that cancelled the job
+    again. cleanup, if given, is called with the job's result once the
+    finished job is forgotten, to release what the result points to (such
+    as a file).
+    """
+    with _jobs_lock:
+        job = _jobs.get((kind, key))
+        if job is None or (retry and job.status in ("failed", "cancelled")):
+            job = Job(label)
+            job.cleanup = cleanup
+            job.future = _executor.submit(contextvars.copy_context().run, _run, kind, job, function, args, kwargs)
+            _jobs[(kind, key)] = job
+        _jobs.move_to_end((kind, key))
+        if session is not None:
+            job.subscribe(session, retry)
+
+        # Forget the oldest finished jobs; running ones are always kept
+        finished = [job_key for job_key, old_job in _jobs.items() if not old_job.active]
+        forgotten = [_jobs.pop(job_key) for job_key in finished[:max(0, len(finished) - JOB_HISTORY_SIZE)]]
+    for old_job in forgotten:
+        if old_job.cleanup is not None and old_job.status == "done":
+            old_job.cleanup(old_job.result())
+    return job
+
+
+def _run(kind, job, function, args, kwargs):
+    with timed(f"job.{kind}"):
+        result = function(*args, progress=job.report, **kwargs)
+    job.progress = 1.0
+    return result
+
+
+def find_job(kind, key):
+    with _jobs_lock:
+        return _jobs.get((kind, key))
+
+
+def forget_job(kind, key):
+    # Drop a job so that the next submit starts it again; its cleanup is
+    # not run, since what its result points to is already gone
+    with _jobs_lock:
+        return _jobs.pop((kind, key), None)
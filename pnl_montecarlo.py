@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Monte Carlo risk simulation of the Single Product Model.
+# Uncertain inputs and conversion rates are drawn in vectorized batches and
+# pushed through compute_single_product as arrays. Large runs are split into
+# fixed-size shards, each with its own child seed, so results are the same
+# whatever the number of worker processes.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from pnl_engine import compute_single_product
+
+
+# Start method of the worker processes: they are started from the threaded
+# app server, where forking could copy a held lock and deadlock the child
+PROCESS_CONTEXT = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+# Inputs (Tab 1 keys or conversion rate currencies) that can be simulated
+SIMULATED_INPUTS = ["exw_cost", "freight_cost", "fob_cost", "projected_units_sold"]
+
+DISTRIBUTIONS = ["fixed", "normal", "uniform", "triangular"]
+
+# Samples drawn per shard; also the unit of work sent to a worker process
+SHARD_SIZE = 250_000
+
+# Below this many samples a process pool costs more than it saves
+PARALLEL_MIN_SAMPLES = 2_000_000
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def distribution_around(value, kind, spread_percentage):
+    # Distribution centred on value with a +/- spread given in percent
+    spread = abs(value) * spread_percentage / 100
+    if kind == "normal":
+        return ("normal", value, spread)
+    if kind == "uniform":
+        return ("uniform", value - spread, value + spread)
+    if kind == "triangular" and spread > 0:
+        return ("triangular", value - spread, value, value + spread)
+    return ("fixed",)
+
+
+def _draw(rng, distribution, size):
+    kind, *params = distribution
+    if kind == "normal":
+        mean, std = params
+        return rng.normal(mean, std, size)
+    if kind == "uniform":
+        low, high = params
+        return rng.uniform(low, high, size)
+    if kind == "triangular":
+        low, mode, high = params
+        return rng.triangular(low, mode, high, size)
+    raise ValueError(f"Unknown distribution: {kind!r}")
+
+
+def _simulate_shard(inputs, conversion_rates, distributions, size, seed_sequence):
+    # Net profit (EUR) of one shard of samples
+    rng = np.random.default_rng(seed_sequence)
+    inputs = dict(inputs)
+    conversion_rates = dict(conversion_rates)
+    for key, distribution in distributions.items():
+        if distribution[0] == "fixed":
+            continue
+        values = _draw(rng, distribution, size)
+        if key in conversion_rates:
+            conversion_rates[key] = np.maximum(values, 1e-9)
+        elif key == "projected_units_sold":
+            # Same floor as the Tab 1 input
+            inputs[key] = np.maximum(values, 1)
+        else:
+            inputs[key] = np.maximum(values, 0)
+
+    model = compute_single_product(inputs, conversion_rates)
+    net_profit = np.broadcast_to(model["net_profit_total"], (size,)).astype(float)
+    converted = {currency: net_profit * np.broadcast_to(rate, (size,)) for currency, rate in conversion_rates.items()}
+    return {"EUR": net_profit, **converted}
+
+
+def simulate_net_profit(inputs, conversion_rates, distributions, samples, seed=0, workers=None, progress=None):
+    """Draw samples of the Single Product Model's net profit (direct + revenue share).
+
+    distributions maps Tab 1 input keys or conversion rate currencies to
+    ("normal", mean, std), ("uniform", low, high), ("triangular", low,
+    mode, high) or ("fixed",). Returns a dict of sample arrays per currency.
+    progress, if given, is called with the fraction of shards done.
+    """
+    if samples < 1:
+        raise ValueError("samples must be at least 1")
+    shard_sizes = [SHARD_SIZE] * (samples // SHARD_SIZE)
+    if samples % SHARD_SIZE:
+        shard_sizes.append(samples % SHARD_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(shard_sizes))
+
+    if workers is None:
+        workers = min(len(shard_sizes), os.cpu_count() or 1) if samples >= PARALLEL_MIN_SAMPLES else 1
+    def report(done):
+        if progress is not None:
+            progress(done / len(shard_sizes), f"{done:,} of {len(shard_sizes):,} shards simulated")
+
+    report(0)
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=PROCESS_CONTEXT)
+        try:
+            futures = [executor.submit(_simulate_shard, inputs, conversion_rates, distributions, size, seed) for size, seed in zip(shard_sizes, seeds)]
+            for done, _ in enumerate(as_completed(futures), start=1):
+                report(done)
+            shards = [future.result() for future in futures]
+        finally:
+            # Drop the queued shards if a progress report stopped the run
+            executor.shutdown(cancel_futures=True)
+    else:
+        shards = []
+        for size, seed in zip(shard_sizes, seeds):
+            shards.append(_simulate_shard(inputs, conversion_rates, distributions, size, seed))
+            report(len(shards))
+
+    return {currency: np.concatenate([shard[currency] for shard in shards]) for currency in shards[0]}
+
+
+def summarize(samples, bins=60):
+    # Percentiles, probability of loss and a histogram of one sample array
+    counts, edges = np.histogram(samples, bins=bins)
+    return {
+        "mean": samples.mean(),
+        "std": samples.std(),
+        "percentiles": dict(zip(PERCENTILES, np.percentile(samples, PERCENTILES))),
+        "probability_of_loss": (samples < 0).mean(),
+        "histogram": (counts, edges),
+    }
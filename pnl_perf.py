@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Per-stage timing and memory instrumentation.
+# Code wraps its stages in `with timed("tab2.compute"):`. Every stage records
+# its wall and CPU time and the change in resident memory, is added to the
+# current run (one Streamlit rerun) for the debug panel, and is written as a
+# JSON line to a local log file for aggregation across sessions:
+#
+#   python pnl_perf.py                 # hot spots in the default log
+#   python pnl_perf.py /var/log/pnl_perf.jsonl
+#
+# PNL_PERF_LOG sets the log file ("" turns logging off) and
+# PNL_PERF_TRACEMALLOC=1 also records the peak Python allocations of
+# top-level stages, at a noticeable cost in speed.
+
+import contextlib
+import contextvars
+import glob
+import itertools
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from logging.handlers import RotatingFileHandler
+
+
+PERF_LOG_PATH = os.environ.get("PNL_PERF_LOG", os.path.join(tempfile.gettempdir(), "pnl_perf.jsonl"))
+
+# The log rotates at this size, keeping this many old files
+PERF_LOG_MAX_BYTES = 10 * 1024 * 1024
+PERF_LOG_BACKUPS = 3
+
+TRACE_MEMORY = os.environ.get("PNL_PERF_TRACEMALLOC") == "1"
+
+MB = 1024 * 1024
+
+_current_run = contextvars.ContextVar("perf_run", default=None)
+_current_stages = contextvars.ContextVar("perf_stages", default=())
+_run_ids = itertools.count(1)
+_logger = logging.getLogger("pnl_perf")
+_logger_lock = threading.Lock()
+
+
+def _resident_bytes():
+    # Current resident set size; Linux only, None elsewhere
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _log(record):
+    if not PERF_LOG_PATH:
+        return
+    with _logger_lock:
+        if not _logger.handlers:
+            handler = RotatingFileHandler(PERF_LOG_PATH, maxBytes=PERF_LOG_MAX_BYTES, backupCount=PERF_LOG_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _logger.addHandler(handler)
+            _logger.setLevel(logging.INFO)
+            _logger.propagate = False
+    _logger.info(json.dumps(record, default=str))
+
+
+def begin_run(label, **fields):
+    """Start collecting the stages of one run in this context.
+
+    fields (e.g. the session) are added to every record of the run. Work
+    submitted to background jobs with a copy of the context reports to the
+    run that started it.
+    """
+    run = {"id": next(_run_ids), "label": label, "started": time.time(), "seconds": None, "finished": False, "fields": fields, "records": []}
+    _current_run.set(run)
+    _current_stages.set(())
+    return run
+
+
+def end_run(run):
+    # Record the run's own wall time; jobs it started may still add stages
+    run["finished"] = True
+    run["seconds"] = time.time() - run["started"]
+    _log({"run": run["id"], "run_label": run["label"], **run["fields"], "time": time.time(), "stage": f"run.{run['label']}", "depth": 0, "seconds": round(run["seconds"], 6)})
+
+
+def current_run():
+    # The run of this context, or None if it has finished
+    run = _current_run.get()
+    return None if run is None or run["finished"] else run
+
+
+@contextlib.contextmanager
+def timed(stage, **fields):
+    """Time a stage; fields (e.g. rows) are added to its record."""
+    parents = _current_stages.get()
+    token = _current_stages.set(parents + (stage,))
+    trace = TRACE_MEMORY and not parents
+    if trace:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        traced_before = tracemalloc.get_traced_memory()[0]
+    resident_before = _resident_bytes()
+    cpu_start = time.thread_time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as exc:
+        # Streamlit's rerun and stop signals are not errors
+        error = type(exc).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        cpu_seconds = time.thread_time() - cpu_start
+        resident_after = _resident_bytes()
+        _current_stages.reset(token)
+
+        run = _current_run.get()
+        record = {
+            "time": time.time(),
+            "stage": stage,
+            "parent": parents[-1] if parents else None,
+            "depth": len(parents),
+            "seconds": round(seconds, 6),
+            "cpu_seconds": round(cpu_seconds, 6),
+            "rss_mb": None if resident_after is None else round(resident_after / MB, 2),
+            "rss_delta_mb": None if resident_after is None or resident_before is None else round((resident_after - resident_before) / MB, 2),
+            **fields,
+        }
+        if trace:
+            record["peak_alloc_mb"] = round((tracemalloc.get_traced_memory()[1] - traced_before) / MB, 2)
+        if error is not None:
+            record["error"] = error
+        if run is not None:
+            record = {"run": run["id"], "run_label": run["label"], **run["fields"], **record}
+            run["records"].append(record)
+        _log(record)
+
+
+def summarize_log(path=PERF_LOG_PATH):
+    """Per-stage totals and percentiles of a log file and its rotated copies, slowest first."""
+    import pandas as pd
+
+    records = []
+    for log_path in sorted(glob.glob(glob.escape(path) + "*")):
+        with open(log_path, encoding="utf-8") as log_file:
+            records.extend(json.loads(line) for line in log_file if line.strip())
+    if not records:
+        return pd.DataFrame()
+    seconds = pd.DataFrame(records).groupby("stage")["seconds"]
+    summary = pd.DataFrame({
+        "count": seconds.count(),
+        "total": seconds.sum(),
+        "mean": seconds.mean(),
+        "p50": seconds.median(),
+        "p95": seconds.quantile(0.95),
+        "max": seconds.max(),
+    })
+    return summary.sort_values("total", ascending=False)
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else PERF_LOG_PATH
+    summary = summarize_log(path)
+    if summary.empty:
+        print(f"No timing records in {path}")
+    else:
+        print(summary.to_string(float_format="{:.3f}".format))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Sensitivity analysis of the Single Product Model.
+# The Tab 1 formulas are evaluated once over a full parameter grid by
+# giving each varied input its own array axis and letting NumPy broadcast.
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+from pnl_engine import profit_margin
+
+
+# Inputs that can be varied, with their display labels
+SENSITIVITY_PARAMETERS = {
+    "markup_percentage": "Markup Percentage (%)",
+    "projected_units_sold": "Projected Units Sold",
+    "freight_cost": "Freight Cost (Total, EUR)",
+    "fob_cost": "FOB Cost (Total, EUR)",
+    "exw_cost": "EXW Cost per Unit (EUR)",
+    "revenue_share_percentage": "Revenue Share Percentage (%)",
+}
+
+# Model values that can be shown for every grid point
+SENSITIVITY_METRICS = {
+    "net_profit_total": "Net Profit (Direct + Revenue Share, EUR)",
+    "net_profit_margin_total": "Net Profit Margin (Direct + Revenue Share, %)",
+    "net_profit_direct": "Net Profit (Direct Revenue only, EUR)",
+    "gross_profit_total": "Gross Profit (Direct + Revenue Share, EUR)",
+    "selling_price": "Selling Price per Unit (EUR)",
+    "total_cogs": "Total COGS (EUR)",
+}
+
+# Largest grid that can be evaluated; each metric takes 8 bytes per point
+MAX_GRID_POINTS = 20_000_000
+
+# Grid points evaluated per step; the grid is split along its last axis so
+# the intermediate values of one step stay around 100 MB
+CHUNK_POINTS = 1_000_000
+
+# Largest grid exported as a table (one row per point, every metric)
+MAX_TABLE_POINTS = 1_000_000
+
+# The model values the metrics need, with the same operations as
+# compute_single_product (tests check they agree), so a metric is computed
+# without the rest: {key: function(value, conversion_rates)} where
+# value(key) gives any other model value or input
+MODEL_STEPS = {
+    "base_price": lambda value, rates: value("exw_cost") + ((value("freight_cost") + value("fob_cost")) / value("projected_units_sold")) + (value("packaging_cost") + value("warehousing_cost")),
+    "selling_price": lambda value, rates: value("base_price") + (value("base_price") * value("markup_percentage") / 100),
+    "revenue_share_per_unit": lambda value, rates: value("selling_price") * (value("revenue_share_percentage") / 100),
+    "direct_revenue": lambda value, rates: value("selling_price") * value("projected_units_sold"),
+    "total_revenue_share": lambda value, rates: value("revenue_share_per_unit") * value("projected_units_sold"),
+    "total_revenue": lambda value, rates: value("direct_revenue") + value("total_revenue_share"),
+    "total_freight_and_logistics": lambda value, rates: value("freight_cost") + value("fob_cost"),
+    "total_cogs": lambda value, rates: (
+        (value("exw_cost") * value("projected_units_sold"))
+        + value("total_freight_and_logistics")
+        + (value("packaging_cost") * value("projected_units_sold"))
+        + (value("warehousing_cost") * value("projected_units_sold"))
+    ),
+    "gross_profit_direct": lambda value, rates: value("direct_revenue") - value("total_cogs"),
+    "gross_profit_total": lambda value, rates: value("total_revenue") - value("total_cogs"),
+    "operating_expenses_aed": lambda value, rates: (
+        (value("salaries_aed") * 12) + (value("rental_aed") * 12) + (value("utilities_aed") * 12) + value("sales_tax_aed") + value("admin_aed") + value("licences_aed") + value("depreciation_aed")
+    ),
+    "operating_expenses_eur": lambda value, rates: value("operating_expenses_aed") / rates["AED"],
+    "net_profit_direct": lambda value, rates: value("gross_profit_direct") - value("operating_expenses_eur"),
+    "net_profit_total": lambda value, rates: value("gross_profit_total") - value("operating_expenses_eur"),
+    "net_profit_margin_total": lambda value, rates: profit_margin(value("net_profit_total"), value("total_revenue")),
+}
+
+
+def _model_value(values, conversion_rates, key):
+    # A model value, computed from its steps once and kept in values
+    if key not in values:
+        values[key] = MODEL_STEPS[key](functools.partial(_model_value, values, conversion_rates), conversion_rates)
+    return values[key]
+
+
+def model_values(inputs, conversion_rates, keys):
+    # The model values named in keys, computing only the steps they need
+    values = dict(inputs)
+    return {key: _model_value(values, conversion_rates, key) for key in keys}
+
+
+def grid_points(axes):
+    # Number of combinations of axis values
+    return int(np.prod([len(values) for values in axes.values()]))
+
+
+def sensitivity_grid(inputs, axes, conversion_rates, metrics=None):
+    """Evaluate the Single Product Model over every combination of axis values.
+
+    axes maps input keys to 1-D arrays of values. Returns a dict with the
+    metrics named in metrics (default: SENSITIVITY_METRICS), each an array of
+    shape (len(values) for values in axes). Only those metrics are computed,
+    CHUNK_POINTS points at a time. Raises ValueError for grids of more than
+    MAX_GRID_POINTS points.
+    """
+    points = grid_points(axes)
+    if points > MAX_GRID_POINTS:
+        raise ValueError(f"{points:,} grid points is more than the {MAX_GRID_POINTS:,} allowed")
+    metrics = list(SENSITIVITY_METRICS if metrics is None else metrics)
+    shape = tuple(len(values) for values in axes.values())
+    grid = {key: np.empty(shape) for key in metrics}
+    if points == 0:
+        return grid
+
+    # Slices of the last axis evaluated per step
+    *_, last_key = axes
+    step = max(1, CHUNK_POINTS // (points // shape[-1]))
+    grid_inputs = dict(inputs)
+    for dimension, (key, values) in enumerate(axes.items()):
+        axis_shape = [1] * len(axes)
+        axis_shape[dimension] = -1
+        grid_inputs[key] = np.asarray(values, dtype=float).reshape(axis_shape)
+    last_values = grid_inputs[last_key]
+    for start in range(0, shape[-1], step):
+        grid_inputs[last_key] = last_values[..., start:start + step]
+        chunk = model_values(grid_inputs, conversion_rates, metrics)
+        for key in metrics:
+            grid[key][..., start:start + step] = chunk[key]
+    return grid
+
+
+def sensitivity_table(axes, grid, metrics=SENSITIVITY_METRICS):
+    # Long format with one row per grid point, for export
+    points = np.meshgrid(*axes.values(), indexing="ij")
+    columns = {SENSITIVITY_PARAMETERS.get(key, key): point.ravel() for key, point in zip(axes, points)}
+    columns.update({metrics[key]: grid[key].ravel() for key in metrics})
+    return pd.DataFrame(columns)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Multi-shipment batch analysis.
+# Each uploaded price list is one shipment with its own freight and FOB
+# cost, spread over that shipment's units only. Operating expenses are
+# charged once across all shipments, so the consolidated net profits add up
+# to the company-level net profit. Price lists are parsed in parallel, and
+# only those not already in the process-wide catalog cache.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from pnl_catalogs import cache_catalog, cached_catalog, catalog_key, parse_catalog
+from pnl_engine import compute_batch, opex_weight_total
+from pnl_solver import SOLVER_COLUMNS, solve_targets
+
+
+# Start method of the worker processes: they are started from the threaded
+# app server, where forking could copy a held lock and deadlock the child
+PROCESS_CONTEXT = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+SHIPMENT_COLUMN = "Shipment"
+
+
+def load_shipments(files, workers=None, progress=None):
+    """Parse (name, bytes) price lists, one worker process per file.
+
+    Files already in the catalog cache are not parsed again. Parsing is CPU
+    bound (openpyxl is pure Python), so processes rather than threads; the
+    wall time is about that of the largest file. progress, if given, is
+    called with the fraction of files read.
+    """
+    def report(done):
+        if progress is not None:
+            progress(done / len(files), f"{done} of {len(files)} price lists read")
+
+    keys = [catalog_key(raw, name) for name, raw in files]
+    shipments = [cached_catalog(key) for key in keys]
+    missing = [index for index, data in enumerate(shipments) if data is None]
+    done = len(files) - len(missing)
+    report(done)
+    if len(missing) < 2:
+        for index in missing:
+            name, raw = files[index]
+            shipments[index] = cache_catalog(keys[index], parse_catalog(raw, name))
+        report(len(files))
+        return shipments
+    workers = min(len(missing), workers or os.cpu_count() or 1)
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=PROCESS_CONTEXT)
+    try:
+        futures = {executor.submit(parse_catalog, files[index][1], files[index][0]): index for index in missing}
+        for done, future in enumerate(as_completed(futures), start=done + 1):
+            index = futures[future]
+            shipments[index] = cache_catalog(keys[index], future.result())
+            report(done)
+        return shipments
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def shipment_params(params, freight_cost, fob_cost):
+    # Batch parameters of one shipment
+    return {**params, "freight_cost": freight_cost, "fob_cost": fob_cost}
+
+
+def compute_shipments(shipments, params, conversion_rates, opex_allocation="equal"):
+    """Consolidated batch P&L of several shipments.
+
+    shipments is a list of (name, data, freight_cost, fob_cost) with data as
+    passed to compute_batch. Returns the rows of every shipment, in order,
+    with a SHIPMENT_COLUMN in front of RESULT_COLUMNS.
+    """
+    # Catalog-wide opex weight, so every shipment gets its share of one total
+    totals = []
+    for name, data, freight_cost, fob_cost in shipments:
+        with_units = data[data["Units"] > 0]
+        units = with_units["Units"].to_numpy()
+        totals.append((len(units), units.sum(), float(with_units["EXW Cost"].to_numpy(dtype=float) @ units)))
+    total_opex_weight = sum(
+        opex_weight_total(opex_allocation, *shipment_totals, shipment_params(params, freight_cost, fob_cost))
+        for shipment_totals, (_, _, freight_cost, fob_cost) in zip(totals, shipments)
+    )
+    if total_opex_weight <= 0:
+        # Nothing to weigh by (e.g. zero markup with gross profit weights)
+        opex_allocation = "equal"
+        total_opex_weight = sum(product_count for product_count, _, _ in totals)
+
+    frames = []
+    for name, data, freight_cost, fob_cost in shipments:
+        results_df = compute_batch(
+            data,
+            shipment_params(params, freight_cost, fob_cost),
+            conversion_rates,
+            opex_allocation=opex_allocation,
+            total_opex_weight=total_opex_weight,
+        )
+        results_df.insert(0, SHIPMENT_COLUMN, name)
+        frames.append(results_df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def solve_shipments(shipments, results_df, params, conversion_rates, target_margin_percentage):
+    # solve_targets for every shipment with its own freight and FOB; rows line
+    # up with compute_shipments and each product keeps its opex share
+    opex_share = (results_df["Gross Profit (EUR)"] - results_df["Net Profit (EUR)"]).to_numpy()
+    frames = []
+    start = 0
+    for name, data, freight_cost, fob_cost in shipments:
+        end = start + int((data["Units"] > 0).sum())
+        frames.append(solve_targets(
+            data,
+            shipment_params(params, freight_cost, fob_cost),
+            conversion_rates,
+            target_margin_percentage,
+            operating_expenses_eur=opex_share[start:end],
+        ))
+        start = end
+    return pd.concat(frames, ignore_index=True)
+
+
+def shipment_summary(results_df):
+    # Totals per shipment, in upload order
+    # observed: stored results keep the shipment as a categorical
+    summary = results_df.drop(columns=["Product Name", *SOLVER_COLUMNS], errors="ignore").groupby(SHIPMENT_COLUMN, sort=False, observed=True).sum(numeric_only=True)
+    summary.insert(0, "Products", results_df.groupby(SHIPMENT_COLUMN, sort=False, observed=True).size())
+    return summary.reset_index()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Catalog-wide target-margin solver for the Batch Product Analysis.
+# For every product it finds the markup, the minimum units and the maximum
+# EXW cost that reach a target net margin (net profit over total revenue,
+# direct + revenue share). Markup and EXW cost have closed forms; minimum
+# units need a vectorized bisection because freight/FOB per unit depends on
+# the total units of the catalog.
+
+import numpy as np
+import pandas as pd
+
+from pnl_engine import batch_operating_expenses_aed
+
+
+SOLVER_COLUMNS = [
+    "Markup for Target Margin (%)",
+    "Minimum Units for Target Margin",
+    "Max EXW Cost for Target Margin (EUR)",
+]
+
+BISECTION_STEPS = 60
+
+
+def solve_targets(data, params, conversion_rates, target_margin_percentage, operating_expenses_eur=None):
+    """Solve every product of a batch for a target net margin.
+
+    data is the same frame passed to compute_batch and the result rows line
+    up with its output. operating_expenses_eur is the opex charged to each
+    product (scalar or array); by default the full annual opex, as in
+    compute_batch. Unreachable targets are NaN.
+    """
+    data = data[data["Units"] > 0]
+    units = data["Units"].to_numpy(dtype=float)
+    exw_cost = data["EXW Cost"].to_numpy(dtype=float)
+    packaging_cost = params["packaging_cost"]
+    warehousing_cost = params["warehousing_cost"]
+    freight_and_fob = params["freight_cost"] + params["fob_cost"]
+    total_non_zero_units = units.sum()
+    cost_per_unit = freight_and_fob / total_non_zero_units if total_non_zero_units > 0 else 0
+
+    markup = params["markup_percentage"] / 100
+    revenue_share = params["revenue_share_percentage"] / 100
+    target = target_margin_percentage / 100
+    if operating_expenses_eur is None:
+        operating_expenses_eur = batch_operating_expenses_aed(params) / conversion_rates["AED"]
+    opex = np.broadcast_to(np.asarray(operating_expenses_eur, dtype=float), units.shape)
+
+    # Net profit = units * unit cost * ((1 + markup)(1 + share) - 1) - opex and
+    # total revenue = units * unit cost * (1 + markup)(1 + share), so the target
+    # holds when units * unit cost * margin_factor = opex
+    unit_cost = exw_cost + cost_per_unit + packaging_cost + warehousing_cost
+    margin_factor = (1 + markup) * (1 + revenue_share) * (1 - target) - 1
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Markup: solve the same equation for (1 + markup)
+        required_price = (units * unit_cost + opex) / (units * (1 + revenue_share) * (1 - target))
+        target_markup = (required_price / unit_cost - 1) * 100
+
+        # EXW cost: keep today's selling price and solve for the unit cost
+        selling_price = unit_cost * (1 + markup)
+        max_unit_cost = selling_price * (1 + revenue_share) * (1 - target) - opex / units
+        max_exw_cost = max_unit_cost - cost_per_unit - packaging_cost - warehousing_cost
+
+    min_units = _minimum_units(
+        exw_cost + packaging_cost + warehousing_cost,
+        freight_and_fob,
+        total_non_zero_units - units,
+        margin_factor,
+        opex,
+    )
+
+    solved = pd.DataFrame({
+        SOLVER_COLUMNS[0]: target_markup,
+        SOLVER_COLUMNS[1]: min_units,
+        SOLVER_COLUMNS[2]: max_exw_cost,
+    })
+    if target >= 1:
+        solved[:] = np.nan
+    return solved.replace([np.inf, -np.inf], np.nan)
+
+
+def _minimum_units(fixed_unit_cost, freight_and_fob, other_units, margin_factor, opex):
+    # Smallest whole number of units with
+    #   u * (fixed_unit_cost + freight_and_fob / (other_units + u)) * margin_factor >= opex
+    # The left side grows with u, so bracket the root by doubling, then bisect
+    # every product at once.
+    def shortfall(u):
+        return u * (fixed_unit_cost + freight_and_fob / (other_units + u)) * margin_factor - opex
+
+    reachable = margin_factor > 0
+    high = np.ones_like(opex)
+    for _ in range(64):
+        short = reachable & (shortfall(high) < 0)
+        if not short.any():
+            break
+        high = np.where(short, high * 2, high)
+    reachable &= shortfall(high) >= 0
+
+    low = np.zeros_like(high)
+    for _ in range(BISECTION_STEPS):
+        middle = (low + high) / 2
+        enough = shortfall(middle) >= 0
+        high = np.where(enough, middle, high)
+        low = np.where(enough, low, middle)
+
+    return np.where(reachable, np.maximum(np.ceil(high), 1), np.nan)
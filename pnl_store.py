@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# On-disk columnar store for batch results.
+# Each result set is written once as an uncompressed Arrow IPC file named by
+# a hash of its contents, and sessions keep only that ID. Reads are memory
+# mapped, so the dashboard and the exports share the pages of one file
+# instead of each session holding its own copy of the results. Results are
+# stored compact (see compact_results) with the conversion rates they were
+# computed with, and the converted currency columns are derived on load.
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from pnl_engine import with_currency_columns
+
+
+STORE_DIR = os.environ.get("PNL_RESULTS_DIR", os.path.join(tempfile.gettempdir(), "pnl_results"))
+
+# Result files (and their exports) untouched for this long are removed
+STORE_MAX_AGE_SECONDS = 24 * 60 * 60
+
+# Schema metadata key holding the conversion rates of stored results
+RATES_METADATA_KEY = b"pnl_conversion_rates"
+
+
+def results_hash(results_df, conversion_rates=None):
+    # Content hash of a results frame (and its rates), computed column by column
+    digest = hashlib.sha256(json.dumps(conversion_rates, sort_keys=True).encode("utf-8"))
+    for column in results_df.columns:
+        digest.update(str(column).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(results_df[column], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def store_path(result_id, extension=".arrow"):
+    return os.path.join(STORE_DIR, result_id + extension)
+
+
+def save_results(results_df, conversion_rates=None):
+    """Write a results frame to the store and return its ID.
+
+    Text columns (product names) are stored as strings and categorical
+    columns as dictionaries. Pass the conversion rates of compact results
+    so load_results can derive their converted columns. Saving the same
+    results twice reuses the existing file.
+    """
+    result_id = results_hash(results_df, conversion_rates)
+    path = store_path(result_id)
+    if os.path.exists(path):
+        os.utime(path)
+        return result_id
+
+    os.makedirs(STORE_DIR, exist_ok=True)
+    text_columns = results_df.select_dtypes(exclude=["number", "category"]).columns
+    table = pa.Table.from_pandas(results_df.astype({column: str for column in text_columns}), preserve_index=False)
+    if conversion_rates is not None:
+        table = table.replace_schema_metadata({**table.schema.metadata, RATES_METADATA_KEY: json.dumps(conversion_rates).encode("utf-8")})
+
+    # Write under a temporary name so readers never see a partial file
+    handle, temp_path = tempfile.mkstemp(dir=STORE_DIR, prefix="partial-")
+    with os.fdopen(handle, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temp_path, path)
+    prune_store()
+    return result_id
+
+
+def load_results(result_id, converted=False):
+    """Memory-mapped read; numeric columns point into the mapped file.
+
+    With converted, the currency columns left out of compact results are
+    derived from the stored conversion rates (for display and exports).
+    Loading marks the file as used, so prune_store keeps it.
+    """
+    path = store_path(result_id)
+    os.utime(path)
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    results_df = table.to_pandas(split_blocks=True)
+    rates = (table.schema.metadata or {}).get(RATES_METADATA_KEY)
+    if converted and rates is not None:
+        results_df = with_currency_columns(results_df, json.loads(rates))
+    return results_df
+
+
+def store_export(result_id, extension, write, **kwargs):
+    """Path of an export of stored results, built once with write(results_df, path, **kwargs)."""
+    path = store_path(result_id, extension)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        # Keep the extension, writers pick their format from it
+        handle, temp_path = tempfile.mkstemp(dir=STORE_DIR, prefix="partial-", suffix=extension)
+        os.close(handle)
+        try:
+            write(load_results(result_id, converted=True), temp_path, **kwargs)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        os.replace(temp_path, path)
+    return path
+
+
+def prune_store(max_age_seconds=STORE_MAX_AGE_SECONDS):
+    # Remove result files and exports not used recently
+    cutoff = time.time() - max_age_seconds
+    for entry in os.scandir(STORE_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Streaming batch pipeline for price lists larger than memory.
+# The file is read twice in fixed-size chunks: a cheap first pass keeps the
+# running totals used to spread freight/FOB and operating expenses, the
+# second pass computes each chunk and appends its results to a CSV file.
+
+import itertools
+
+import pandas as pd
+
+from pnl_engine import PRICE_LIST_COLUMNS, RESULT_COLUMNS, clean_price_list, compute_batch, opex_weight_total, whole_units
+
+
+CHUNK_SIZE = 50_000
+
+
+def iter_price_list_chunks(source, chunk_size=CHUNK_SIZE):
+    """Yield cleaned price list chunks from an .xlsx or .csv path or file object."""
+    if hasattr(source, "seek"):
+        source.seek(0)
+    name = str(getattr(source, "name", source)).lower()
+
+    if name.endswith(".csv"):
+        for chunk in pd.read_csv(source, header=None, usecols=[0, 1, 2], chunksize=chunk_size):
+            yield _prepare_chunk(chunk)
+        return
+
+    # openpyxl's read-only mode streams rows without loading the whole sheet
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(max_col=3, values_only=True)
+        while True:
+            block = list(itertools.islice(rows, chunk_size))
+            if not block:
+                break
+            chunk = pd.DataFrame(block).reindex(columns=range(len(PRICE_LIST_COLUMNS)))
+            yield _prepare_chunk(chunk)
+    finally:
+        workbook.close()
+
+
+def _prepare_chunk(chunk):
+    chunk = clean_price_list(chunk)
+    chunk["Units"] = whole_units(chunk["Units"])
+    return chunk
+
+
+def scan_price_list(source, chunk_size=CHUNK_SIZE, progress=None):
+    """First pass: running totals over the valid products with units.
+
+    Returns the product count, total units and total EXW cost x units, which
+    is all the freight/FOB and operating expense allocations need, plus the
+    number of valid rows.
+    """
+    totals = {"products": 0, "units": 0, "exw_cost": 0.0, "rows": 0}
+    for chunk in iter_price_list_chunks(source, chunk_size):
+        if progress is not None:
+            progress(0, f"Scanning price list ({totals['rows']:,} rows)")
+        totals["rows"] += len(chunk)
+        chunk = chunk[chunk["Units"] > 0]
+        units = chunk["Units"].to_numpy()
+        totals["products"] += len(chunk)
+        totals["units"] += int(units.sum())
+        totals["exw_cost"] += float((chunk["EXW Cost"].to_numpy(dtype=float) * units).sum())
+    return totals
+
+
+def stream_batch(source, output_path, params, conversion_rates, chunk_size=CHUNK_SIZE, opex_allocation="equal", progress=None):
+    """Run the batch analysis chunk by chunk and write the results to a CSV file.
+
+    Peak memory is bounded by chunk_size. Returns the totals row as a dict,
+    which is also appended as the last line of the file. progress, if given,
+    is called with the fraction of rows processed in the second pass.
+    """
+    totals = scan_price_list(source, chunk_size, progress)
+    total_opex_weight = opex_weight_total(opex_allocation, totals["products"], totals["units"], totals["exw_cost"], params)
+
+    column_totals = pd.Series(0.0, index=RESULT_COLUMNS[1:])
+    with open(output_path, "w", newline="", encoding="utf-8") as output:
+        pd.DataFrame(columns=RESULT_COLUMNS).to_csv(output, index=False)
+        rows_done = 0
+        for chunk in iter_price_list_chunks(source, chunk_size):
+            if progress is not None:
+                progress(rows_done / max(totals["rows"], 1), f"Computing rows {rows_done:,}-{rows_done + len(chunk):,}")
+            rows_done += len(chunk)
+            results = compute_batch(
+                chunk, params, conversion_rates,
+                total_non_zero_units=totals["units"],
+                opex_allocation=opex_allocation,
+                total_opex_weight=total_opex_weight,
+            )
+            results.to_csv(output, index=False, header=False)
+            column_totals += results[RESULT_COLUMNS[1:]].sum()
+
+        total_row = {"Product Name": "Total", **column_totals.to_dict()}
+        total_row["Number of Units"] = int(total_row["Number of Units"])
+        pd.DataFrame([total_row]).to_csv(output, index=False, header=False)
+    return total_row
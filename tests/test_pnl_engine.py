@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pnl_engine import DEFAULT_BATCH_PARAMS, OPEX_ALLOCATIONS, RESULT_COLUMNS, add_total_row, batch_operating_expenses_aed, compute_batch, opex_weight_total, opex_weights
+from pnl_stream import scan_price_list, stream_batch
+
+
+CONVERSION_RATES = {"SAR": 4.11, "AED": 3.91}
+
+
+def price_list(products=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Product Name": [f"Product {row}" for row in range(products)],
+        "EXW Cost": np.round(rng.lognormal(0.0, 0.8, products), 2),
+        "Units": np.where(rng.random(products) < 0.1, 0, rng.integers(1, 5000, products)),
+    })
+
+
+def iterrows_batch(data, params, conversion_rates):
+    # The batch loop compute_batch replaced, formula for formula
+    data = data[data["Units"] > 0]
+    total_non_zero_units = data["Units"].sum()
+    cost_per_unit = (params["freight_cost"] + params["fob_cost"]) / total_non_zero_units if total_non_zero_units > 0 else 0
+    results = []
+    for _, row in data.iterrows():
+        exw_cost = row["EXW Cost"]
+        units = row["Units"]
+        base_price = exw_cost + cost_per_unit + params["packaging_cost"] + params["warehousing_cost"]
+        selling_price = base_price + (base_price * params["markup_percentage"] / 100)
+        revenue_share_per_unit = selling_price * (params["revenue_share_percentage"] / 100)
+        direct_revenue = selling_price * units
+        total_revenue_share = revenue_share_per_unit * units
+        total_revenue = direct_revenue + total_revenue_share
+        total_cogs = (
+            (exw_cost * units)
+            + (cost_per_unit * units)
+            + (params["packaging_cost"] * units)
+            + (params["warehousing_cost"] * units)
+        )
+        gross_profit = total_revenue - total_cogs
+        net_profit = gross_profit - batch_operating_expenses_aed(params) / conversion_rates["AED"]
+        row_results = {"Product Name": row["Product Name"], "Number of Units": units}
+        for label, value in [
+            ("Selling Price per Unit", selling_price),
+            ("Total Revenue", total_revenue),
+            ("Total COGS", total_cogs),
+            ("Gross Profit", gross_profit),
+            ("Net Profit", net_profit),
+        ]:
+            row_results[f"{label} (EUR)"] = value
+            row_results[f"{label} (SAR)"] = value * conversion_rates["SAR"]
+            row_results[f"{label} (AED)"] = value * conversion_rates["AED"]
+        results.append(row_results)
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+
+@pytest.mark.parametrize("params", [
+    DEFAULT_BATCH_PARAMS,
+    {**DEFAULT_BATCH_PARAMS, "markup_percentage": 35.0, "packaging_cost": 0.4, "warehousing_cost": 1.25},
+])
+def test_compute_batch_matches_iterrows_loop(params):
+    # Without operating expenses (which are now split across products
+    # instead of charged to each one) every column matches the old loop
+    data = price_list()
+    expected = iterrows_batch(data, params, CONVERSION_RATES)
+    results_df = compute_batch(data, params, CONVERSION_RATES)
+    assert list(results_df.columns) == RESULT_COLUMNS
+    assert results_df["Product Name"].tolist() == expected["Product Name"].tolist()
+    assert results_df["Number of Units"].tolist() == expected["Number of Units"].tolist()
+    for column in RESULT_COLUMNS[2:]:
+        np.testing.assert_array_equal(results_df[column].to_numpy(), expected[column].to_numpy(dtype=float))
+
+
+def test_compute_batch_keeps_product_name_dtype():
+    data = price_list()
+    data["Product Name"] = data["Product Name"].astype("str")
+    results_df = compute_batch(data, DEFAULT_BATCH_PARAMS, CONVERSION_RATES)
+    assert results_df["Product Name"].dtype == data["Product Name"].dtype
+    assert results_df.index.equals(pd.RangeIndex(len(results_df)))
+
+
+def test_compute_batch_without_units():
+    data = price_list(5)
+    data["Units"] = 0
+    assert len(compute_batch(data, DEFAULT_BATCH_PARAMS, CONVERSION_RATES)) == 0
+
+
+def test_total_row_sums_products():
+    results_df = add_total_row(compute_batch(price_list(), DEFAULT_BATCH_PARAMS, CONVERSION_RATES))
+    total = results_df.iloc[-1]
+    assert total["Product Name"] == "Total"
+    assert total["Total Revenue (EUR)"] == pytest.approx(results_df["Total Revenue (EUR)"].iloc[:-1].sum())
+
+
+@pytest.mark.parametrize("opex_allocation", list(OPEX_ALLOCATIONS))
+def test_operating_expenses_are_charged_once(opex_allocation):
+    params = {**DEFAULT_BATCH_PARAMS, "salaries_aed": 10_000.0, "rental_aed": 2_500.55, "licences_aed": 1_234.56}
+    results_df = add_total_row(compute_batch(price_list(), params, CONVERSION_RATES, opex_allocation=opex_allocation))
+    total = results_df.iloc[-1]
+    total_operating_expenses_eur = batch_operating_expenses_aed(params) / CONVERSION_RATES["AED"]
+    assert total["Gross Profit (EUR)"] - total["Net Profit (EUR)"] == pytest.approx(total_operating_expenses_eur, abs=1e-6)
+    assert total["Net Profit (AED)"] == pytest.approx(total["Gross Profit (AED)"] - batch_operating_expenses_aed(params), abs=1e-5)
+
+
+@pytest.mark.parametrize("opex_allocation", list(OPEX_ALLOCATIONS))
+def test_streaming_totals_match_in_memory(tmp_path, opex_allocation):
+    # The first pass's running totals give the same opex denominator as the
+    # whole catalog, so chunked results match the in-memory ones
+    params = {**DEFAULT_BATCH_PARAMS, "salaries_aed": 10_000.0, "packaging_cost": 0.4}
+    data = price_list(1_000)
+    source = tmp_path / "prices.csv"
+    data.to_csv(source, header=False, index=False)
+    expected = compute_batch(data, params, CONVERSION_RATES, opex_allocation=opex_allocation)
+
+    totals = scan_price_list(str(source), chunk_size=97)
+    nonzero = data[data["Units"] > 0]
+    assert totals["products"] == len(nonzero)
+    assert totals["units"] == nonzero["Units"].sum()
+    weights = opex_weights(opex_allocation, expected["Number of Units"].to_numpy(), expected["Total Revenue (EUR)"].to_numpy(), expected["Gross Profit (EUR)"].to_numpy())
+    total_opex_weight = opex_weight_total(opex_allocation, totals["products"], totals["units"], totals["exw_cost"], params)
+    assert total_opex_weight == pytest.approx(weights.sum(), rel=1e-12)
+
+    total_row = stream_batch(str(source), str(tmp_path / "results.csv"), params, CONVERSION_RATES, chunk_size=97, opex_allocation=opex_allocation)
+    streamed = pd.read_csv(tmp_path / "results.csv")
+    assert len(streamed) == len(expected) + 1
+    for column in RESULT_COLUMNS[1:]:
+        np.testing.assert_allclose(streamed[column].iloc[:-1].to_numpy(dtype=float), expected[column].to_numpy(dtype=float), rtol=1e-9, atol=1e-6)
+        assert total_row[column] == pytest.approx(expected[column].sum(), rel=1e-9, abs=1e-6)
@@ -0,0 +1,171 @@
+import decimal
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pnl_engine import DEFAULT_BATCH_PARAMS, add_total_row, compute_batch, compute_single_product, single_product_result
+from pnl_exact import MINOR_UNITS, MONEY_COLUMNS, ROUNDING_MODES, allocate, compute_batch_exact, divide, single_product_exact, to_major_units, to_minor_units
+
+
+CONVERSION_RATES = {"SAR": 4.11, "AED": 3.91}
+
+# Amounts with a decimal half (both signs) and plain cases, in cents
+AMOUNTS = [0.125, -0.125, 0.135, -0.135, 0.121, -0.129]
+EXPECTED_CENTS = {
+    "half_even": [12, -12, 14, -14, 12, -13],
+    "half_up": [13, -13, 14, -14, 12, -13],
+    "half_down": [12, -12, 13, -13, 12, -13],
+    "down": [12, -12, 13, -13, 12, -12],
+    "up": [13, -13, 14, -14, 13, -13],
+}
+
+
+# Tab 1 inputs: one product at 0.645 EUR with opex that doesn't split evenly
+SINGLE_PRODUCT_INPUTS = {**DEFAULT_BATCH_PARAMS, "exw_cost": 0.645, "projected_units_sold": 26_250, "salaries_aed": 1_000.0, "rental_aed": 500.5}
+
+
+def price_list(products=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Product Name": [f"Product {row}" for row in range(products)],
+        "EXW Cost": np.round(rng.lognormal(0.0, 0.8, products), 2),
+        "Units": np.where(rng.random(products) < 0.1, 0, rng.integers(1, 5000, products)),
+    })
+
+
+def test_rounding_modes_cover_expected():
+    assert set(EXPECTED_CENTS) == set(ROUNDING_MODES)
+
+
+@pytest.mark.parametrize("rounding", list(ROUNDING_MODES))
+def test_to_minor_units_rounds_halves_by_mode(rounding):
+    assert to_minor_units(AMOUNTS, MINOR_UNITS, rounding).tolist() == EXPECTED_CENTS[rounding]
+
+
+@pytest.mark.parametrize("rounding", list(ROUNDING_MODES))
+def test_divide_rounds_halves_by_mode(rounding):
+    numerators = np.array([125, -125, 135, -135, 121, -129], dtype=np.int64)
+    assert divide(numerators, 10, rounding).tolist() == EXPECTED_CENTS[rounding]
+
+
+def test_divide_by_array_of_denominators():
+    assert divide([7, -7, 9], np.array([2, 2, 4]), "half_up").tolist() == [4, -4, 2]
+
+
+def test_unknown_rounding_mode():
+    with pytest.raises(ValueError):
+        to_minor_units([1.005], MINOR_UNITS, "ceiling")
+
+
+@pytest.mark.parametrize("rounding", list(ROUNDING_MODES))
+@pytest.mark.parametrize("total", [0, 1, 99_999, 123_456_789, -98_765])
+def test_allocate_sums_exactly(rounding, total):
+    weights = np.random.default_rng(abs(total)).integers(0, 1000, 997)
+    shares = allocate(total, weights, rounding)
+    assert shares.sum() == total
+    # Each share within one minor unit of its exact value
+    exact = total * weights / weights.sum()
+    assert np.abs(shares - exact).max() < 1
+
+
+def test_allocate_all_zero_weights_splits_equally():
+    shares = allocate(1_000, np.zeros(7, dtype=np.int64))
+    assert shares.sum() == 1_000
+    assert shares.max() - shares.min() <= 1
+
+
+def test_allocate_huge_weights_stay_exact():
+    # total x weight is far beyond int64, so allocate switches to Python
+    # integers; the shares stay within one minor unit of their exact values
+    weights = np.array([2 ** 55, 3 * 2 ** 54, 1, 0, 2 ** 50], dtype=np.int64)
+    shares = allocate(10 ** 12, weights)
+    assert shares.sum() == 10 ** 12
+    exact = [Decimal(10 ** 12) * int(weight) / sum(Decimal(int(w)) for w in weights) for weight in weights]
+    assert all(abs(Decimal(int(share)) - value) <= 1 for share, value in zip(shares, exact))
+
+
+def test_allocate_empty():
+    assert len(allocate(100, [])) == 0
+
+
+@pytest.mark.parametrize("rounding", list(ROUNDING_MODES))
+@pytest.mark.parametrize("opex_allocation", ["equal", "units", "revenue", "gross_profit"])
+def test_totals_reconcile_with_company_net_profit(rounding, opex_allocation):
+    params = {**DEFAULT_BATCH_PARAMS, "salaries_aed": 10_000.0, "rental_aed": 2_500.55, "licences_aed": 1_234.56}
+    results_df = compute_batch_exact(price_list(), params, CONVERSION_RATES, rounding=rounding, opex_allocation=opex_allocation)
+    assert all(results_df[column].dtype == np.int64 for column in MONEY_COLUMNS)
+
+    total = add_total_row(results_df).iloc[-1]
+    for column in MONEY_COLUMNS:
+        assert total[column] == results_df[column].sum()
+
+    # Company net profit: gross profit less the annual opex in EUR cents
+    opex_aed_cents = (1_000_000 + 250_055) * 12 + 123_456
+    decimal_rounding = getattr(decimal, "ROUND_" + rounding.upper())
+    opex_eur_cents = int((Decimal(opex_aed_cents) / Decimal("3.91")).quantize(Decimal(1), rounding=decimal_rounding))
+    assert total["Gross Profit (EUR)"] - total["Net Profit (EUR)"] == opex_eur_cents
+
+    # In amounts, the totals row is the cent-exact sum of the rows
+    major = to_major_units(add_total_row(results_df))
+    assert major["Net Profit (EUR)"].iloc[-1] == pytest.approx(total["Net Profit (EUR)"] / MINOR_UNITS, abs=1e-9)
+
+
+def test_close_to_float_engine():
+    data = price_list(2_000, seed=1)
+    params = {**DEFAULT_BATCH_PARAMS, "salaries_aed": 10_000.0}
+    exact = to_major_units(compute_batch_exact(data, params, CONVERSION_RATES))
+    approximate = compute_batch(data, params, CONVERSION_RATES)
+    # Within 2 cents in EUR; converted columns carry that difference times
+    # the rate, plus their own rounding
+    for column in MONEY_COLUMNS:
+        currency = column[-4:-1]
+        tolerance = 0.02 if currency == "EUR" else 0.02 * CONVERSION_RATES[currency] + 0.005
+        assert np.abs(exact[column].to_numpy() - approximate[column].to_numpy()).max() <= tolerance
+
+
+def test_to_major_units_leaves_amounts_alone():
+    amounts = pd.DataFrame({"Net Profit (EUR)": [1.5, 2.25]})
+    assert to_major_units(amounts) is amounts
+
+
+def single_product_values(result, currency="EUR"):
+    return dict(zip(result["Metric"], result[currency]))
+
+
+def test_single_product_exact_close_to_float_model():
+    exact = single_product_exact(SINGLE_PRODUCT_INPUTS, CONVERSION_RATES)
+    model = compute_single_product(SINGLE_PRODUCT_INPUTS, CONVERSION_RATES)
+    approximate = single_product_result(SINGLE_PRODUCT_INPUTS, model, CONVERSION_RATES)
+    pd.testing.assert_frame_equal(exact[["Section", "Metric", "Kind", "Source"]], approximate[["Section", "Metric", "Kind", "Source"]])
+    money = (exact["Kind"] == "money").to_numpy()
+    for currency, tolerance in [("EUR", 0.02), *((currency, 0.02 * rate + 0.005) for currency, rate in CONVERSION_RATES.items())]:
+        assert np.abs(exact[currency].to_numpy()[money] - approximate[currency].to_numpy()[money]).max() <= tolerance
+    assert np.array_equal(exact["SAR"].isna(), approximate["SAR"].isna())
+
+
+@pytest.mark.parametrize("rounding", list(ROUNDING_MODES))
+def test_single_product_exact_matches_one_product_batch(rounding):
+    exact = single_product_values(single_product_exact(SINGLE_PRODUCT_INPUTS, CONVERSION_RATES, rounding))
+    data = pd.DataFrame({"Product Name": ["Product"], "EXW Cost": [0.645], "Units": [26_250]})
+    batch = to_major_units(compute_batch_exact(data, SINGLE_PRODUCT_INPUTS, CONVERSION_RATES, rounding)).iloc[0]
+    assert exact["Selling Price per Unit"] == batch["Selling Price per Unit (EUR)"]
+    assert exact["Total Revenue"] == batch["Total Revenue (EUR)"]
+    assert exact["Total COGS"] == batch["Total COGS (EUR)"]
+    assert exact["Net Profit (Direct + Revenue Share)"] == batch["Net Profit (EUR)"]
+
+
+@pytest.mark.parametrize("rounding", list(ROUNDING_MODES))
+def test_single_product_exact_net_is_gross_less_opex(rounding):
+    values = single_product_values(single_product_exact(SINGLE_PRODUCT_INPUTS, CONVERSION_RATES, rounding))
+    cents = {metric: round(value * MINOR_UNITS) for metric, value in values.items()}
+    assert cents["Net Profit (Direct Revenue only)"] == cents["Gross Profit (Direct Revenue only)"] - cents["Total Operating Expenses"]
+    assert cents["Net Profit (Direct + Revenue Share)"] == cents["Gross Profit (Direct + Revenue Share)"] - cents["Total Operating Expenses"]
+    assert cents["Total Revenue"] == cents["Direct Revenue"] + cents["Revenue Share"]
+
+
+def test_single_product_exact_keeps_entered_amounts():
+    result = single_product_exact(SINGLE_PRODUCT_INPUTS, CONVERSION_RATES)
+    assert single_product_values(result, "AED")["Rental"] == 500.5
+    assert single_product_values(result)["EXW Cost per Unit"] == 0.645
@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import wait
+
+import pytest
+
+import pnl_jobs
+from pnl_jobs import find_job, submit_job
+
+
+def wait_for_cancel(release, progress=None):
+    # Reports progress until released, so a cancel request stops it
+    while not release.wait(0.01):
+        progress(0.5)
+    return "done"
+
+
+def stopped(job):
+    # Whether the job ended cancelled, before or after it started
+    wait([job.future], timeout=5)
+    return job.status == "cancelled"
+
+
+@pytest.fixture
+def release():
+    release = threading.Event()
+    yield release
+    release.set()
+
+
+def test_cancel_only_detaches_while_other_sessions_follow(release):
+    job = submit_job("test", ("shared", id(release)), "Shared", wait_for_cancel, release, session="a")
+    assert submit_job("test", ("shared", id(release)), "Shared", wait_for_cancel, release, session="b") is job
+
+    job.cancel("a")
+    assert job.status_for("a") == "cancelled"
+    assert job.status_for("b") == "running"
+
+    # Following the job again doesn't undo the cancel; a retry does
+    job.subscribe("a")
+    assert job.status_for("a") == "cancelled"
+    assert submit_job("test", ("shared", id(release)), "Shared", wait_for_cancel, release, session="a", retry=True) is job
+    assert job.status_for("a") == "running"
+
+    job.cancel("a")
+    assert job.status == "running"
+    job.cancel("b")
+    assert stopped(job)
+
+
+def test_stale_subscribers_dont_keep_a_job_running(monkeypatch, release):
+    job = submit_job("test", ("stale", id(release)), "Stale", wait_for_cancel, release, session="a")
+    job.subscribe("b")
+    monkeypatch.setattr(pnl_jobs, "SUBSCRIBER_TIMEOUT", 0)
+    job.cancel("a")
+    assert stopped(job)
+
+
+def test_cancel_without_session_stops_the_job(release):
+    job = submit_job("test", ("direct", id(release)), "Direct", wait_for_cancel, release, session="a")
+    job.cancel()
+    assert stopped(job)
+    assert find_job("test", ("direct", id(release))) is job
+    assert job.status_for("a") == "cancelled"
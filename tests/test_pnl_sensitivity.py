@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+import pnl_sensitivity
+from pnl_engine import compute_single_product
+from pnl_sensitivity import MAX_GRID_POINTS, SENSITIVITY_METRICS, grid_points, sensitivity_grid, sensitivity_table
+
+
+CONVERSION_RATES = {"SAR": 4.11, "AED": 3.91}
+
+INPUTS = {
+    "exw_cost": 12.5,
+    "fob_cost": 1100.0,
+    "freight_cost": 2850.0,
+    "packaging_cost": 0.35,
+    "warehousing_cost": 0.2,
+    "markup_percentage": 21.5,
+    "revenue_share_percentage": 10.0,
+    "projected_units_sold": 20000,
+    "salaries_aed": 15000.0,
+    "rental_aed": 4000.0,
+    "utilities_aed": 600.0,
+    "sales_tax_aed": 1200.0,
+    "admin_aed": 300.0,
+    "licences_aed": 2500.0,
+    "depreciation_aed": 900.0,
+}
+
+AXES = {
+    "markup_percentage": np.linspace(-150.0, 30.0, 13),
+    "projected_units_sold": np.linspace(1.0, 50000.0, 11),
+    "freight_cost": np.linspace(2000.0, 4000.0, 7),
+}
+
+
+def model_grid(axes):
+    # Every model value over the grid, from the Tab 1 function
+    grid_inputs = dict(INPUTS)
+    for dimension, (key, values) in enumerate(axes.items()):
+        shape = [1] * len(axes)
+        shape[dimension] = -1
+        grid_inputs[key] = np.asarray(values).reshape(shape)
+    shape = tuple(len(values) for values in axes.values())
+    return {key: np.broadcast_to(value, shape) for key, value in compute_single_product(grid_inputs, CONVERSION_RATES).items()}
+
+
+@pytest.mark.parametrize("metric", list(SENSITIVITY_METRICS))
+def test_metric_matches_single_product_model(metric):
+    grid = sensitivity_grid(INPUTS, AXES, CONVERSION_RATES, metrics=[metric])
+    assert list(grid) == [metric]
+    np.testing.assert_array_equal(grid[metric], model_grid(AXES)[metric])
+
+
+def test_chunks_cover_the_grid(monkeypatch):
+    # One freight value per step still fills every point
+    monkeypatch.setattr(pnl_sensitivity, "CHUNK_POINTS", 1)
+    grid = sensitivity_grid(INPUTS, AXES, CONVERSION_RATES)
+    expected = model_grid(AXES)
+    for metric in SENSITIVITY_METRICS:
+        np.testing.assert_array_equal(grid[metric], expected[metric])
+
+
+def test_grid_over_the_cap_is_rejected():
+    axes = {key: np.zeros(1000) for key in AXES}
+    assert grid_points(axes) > MAX_GRID_POINTS
+    with pytest.raises(ValueError):
+        sensitivity_grid(INPUTS, axes, CONVERSION_RATES)
+
+
+def test_table_has_a_row_per_point():
+    table = sensitivity_table(AXES, sensitivity_grid(INPUTS, AXES, CONVERSION_RATES))
+    assert len(table) == grid_points(AXES)
+    assert len(table.columns) == len(AXES) + len(SENSITIVITY_METRICS)